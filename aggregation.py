@@ -0,0 +1,91 @@
+import math
+from typing import List, NamedTuple
+
+
+class CategoryTotal(NamedTuple):
+    type: str
+    category: str
+    total: float
+    count: int
+
+
+class TypeStats(NamedTuple):
+    type: str
+    total: float
+    count: int
+    mean: float
+    maximum: float
+    minimum: float
+
+
+class Totals:
+    """Итоги по операциям: сводка по категориям и статистика по типам (как листы Excel отчета).
+
+    Операции передаются по одной через add() - в том же проходе, в котором пишется
+    лист с деталями, поэтому память не зависит от числа операций. Суммы сходятся с
+    pandas до копейки и на миллионах операций: pandas складывает с компенсацией
+    ошибок округления, здесь - тоже (алгоритм Ноймайера).
+    """
+
+    def __init__(self):
+        # (тип, категория) -> [сумма, поправка, количество, максимум, минимум]
+        self._groups = {}
+
+    def add(self, tr_type: str, category: str, amount: float):
+        group = self._groups.get((tr_type, category))
+        if group is None:
+            self._groups[(tr_type, category)] = [amount, 0.0, 1, amount, amount]
+            return
+
+        total = group[0]
+        new_total = total + amount
+        # Теряемые при сложении младшие разряды копятся отдельно
+        if abs(total) >= abs(amount):
+            group[1] += (total - new_total) + amount
+        else:
+            group[1] += (amount - new_total) + total
+        group[0] = new_total
+        group[2] += 1
+        if amount > group[3]:
+            group[3] = amount
+        elif amount < group[4]:
+            group[4] = amount
+
+    def total(self, tr_type: str) -> float:
+        """Общая сумма операций типа (0, если их нет)"""
+        return math.fsum(
+            group[0] + group[1] for (group_type, _), group in self._groups.items() if group_type == tr_type
+        )
+
+    def category_totals(self) -> List[CategoryTotal]:
+        return [
+            CategoryTotal(tr_type, category, total + compensation, count)
+            for (tr_type, category), (total, compensation, count, _, _) in sorted(self._groups.items())
+        ]
+
+    def type_stats(self) -> List[TypeStats]:
+        by_type = {}
+        for (tr_type, _), group in self._groups.items():
+            by_type.setdefault(tr_type, []).append(group)
+
+        stats = []
+        for tr_type, groups in sorted(by_type.items()):
+            total = math.fsum(group[0] + group[1] for group in groups)
+            count = sum(group[2] for group in groups)
+            stats.append(TypeStats(
+                tr_type, total, count, total / count,
+                max(group[3] for group in groups), min(group[4] for group in groups)
+            ))
+        return stats
+
+
+def iter_detail(rows, totals: Totals):
+    """Строки листа с деталями: (дата 'ДД.ММ.ГГГГ ЧЧ:ММ', тип, категория, сумма, описание).
+
+    Попутно каждая операция учитывается в totals - отдельного прохода для итогов не нужно.
+    """
+    add = totals.add
+    for date, tr_type, category, amount, description in rows:
+        add(tr_type, category, amount)
+        # date хранится как 'YYYY-MM-DD HH:MM:SS.ffffff'
+        yield f"{date[8:10]}.{date[5:7]}.{date[0:4]} {date[11:16]}", tr_type, category, amount, description
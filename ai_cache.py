@@ -0,0 +1,112 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import database
+from config import AI_CACHE_TTL, AI_CACHE_MAX_ENTRIES, AI_CACHE_PERSISTENT
+
+
+def make_key(user_id: int, model: str, prompt: str, fingerprint: str) -> str:
+    """Ключ кэша: хэш модели, промпта и отпечатка данных пользователя"""
+    raw = f"{user_id}\0{model}\0{fingerprint}\0{prompt}".encode()
+    return hashlib.sha256(raw).hexdigest()
+
+
+class AICache:
+    """LRU-кэш ответов AI с TTL и необязательным хранением в SQLite"""
+
+    def __init__(self, max_entries: int, ttl: float, persistent: bool = False):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persistent = persistent
+        self.hits = 0
+        self.misses = 0
+        # key -> (user_id, expires_at, value)
+        self._entries = OrderedDict()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self._entries),
+        }
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            user_id, expires_at, value = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        if self.persistent:
+            row = await database.run(_disk_get, key, now)
+            if row is not None:
+                user_id, expires_at, value = row
+                self._remember(key, user_id, expires_at, value)
+                self.hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, user_id: int, value: str):
+        expires_at = time.time() + self.ttl
+        self._remember(key, user_id, expires_at, value)
+
+        if self.persistent:
+            await database.run(_disk_set, key, user_id, value, expires_at, self.max_entries)
+
+    async def invalidate_user(self, user_id: int):
+        """Удаляет все ответы для пользователя (его данные изменились)"""
+        for key in [k for k, entry in self._entries.items() if entry[0] == user_id]:
+            del self._entries[key]
+
+        if self.persistent:
+            await database.run(_disk_invalidate_user, user_id)
+
+    def _remember(self, key, user_id, expires_at, value):
+        self._entries[key] = (user_id, expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def _disk_get(conn, key, now):
+    row = conn.execute(
+        'SELECT user_id, expires_at, value FROM ai_cache WHERE key = ? AND expires_at > ?',
+        (key, now)
+    ).fetchone()
+    if row is not None:
+        conn.execute('UPDATE ai_cache SET accessed_at = ? WHERE key = ?', (now, key))
+    return row
+
+
+def _disk_set(conn, key, user_id, value, expires_at, max_entries):
+    now = time.time()
+    conn.execute('''
+        INSERT OR REPLACE INTO ai_cache (key, user_id, value, expires_at, accessed_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (key, user_id, value, expires_at, now))
+
+    # Просроченные записи и все, что не помещается в лимит LRU
+    conn.execute('DELETE FROM ai_cache WHERE expires_at <= ?', (now,))
+    conn.execute('''
+        DELETE FROM ai_cache WHERE key IN (
+            SELECT key FROM ai_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+        )
+    ''', (max_entries,))
+
+
+def _disk_invalidate_user(conn, user_id):
+    conn.execute('DELETE FROM ai_cache WHERE user_id = ?', (user_id,))
+
+
+cache = AICache(AI_CACHE_MAX_ENTRIES, AI_CACHE_TTL, AI_CACHE_PERSISTENT)
@@ -0,0 +1,329 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Optional
+
+import httpx
+
+import metrics
+import tracing
+from config import (
+    OPENROUTER_API_KEY, OPENROUTER_API_URL, OPENROUTER_MODEL, OPENROUTER_FALLBACK_MODELS,
+    OPENROUTER_CONNECT_TIMEOUT, OPENROUTER_READ_TIMEOUT, OPENROUTER_MAX_CONNECTIONS,
+    OPENROUTER_MAX_RETRIES, OPENROUTER_BACKOFF_BASE, OPENROUTER_BACKOFF_MAX,
+    BREAKER_ERROR_RATE, BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_COOLDOWN,
+)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Общий HTTP-клиент с keep-alive пулом соединений (создается при первом вызове)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(
+                OPENROUTER_READ_TIMEOUT,
+                connect=OPENROUTER_CONNECT_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=OPENROUTER_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENROUTER_MAX_CONNECTIONS,
+            ),
+            headers={
+                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "https://your-site.com",
+                "X-Title": "Financial Bot"
+            },
+        )
+        logging.info("OpenRouter client created (http2=%s)", HTTP2_AVAILABLE)
+    return _client
+
+
+async def close():
+    """Закрывает соединения клиента (вызывается при остановке бота)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def build_payload(prompt: str, model: str) -> dict:
+    return {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.7,
+        "max_tokens": 500
+    }
+
+
+# ===== УСТОЙЧИВОСТЬ: ПОВТОРЫ, CIRCUIT BREAKER, РЕЗЕРВНЫЕ МОДЕЛИ =====
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AIUnavailable(Exception):
+    """Ни одна модель из цепочки не ответила (ошибки или открытые breaker'ы)"""
+
+
+# Значения метрики bot_openrouter_breaker_state
+BREAKER_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+class CircuitBreaker:
+    """Отключает модель, когда доля ошибок в окне последних вызовов превышает порог.
+
+    closed -> open: ошибок больше error_rate (при минимум min_calls вызовах);
+    open -> half_open: через cooldown секунд пропускается один пробный вызов;
+    half_open -> closed при успехе, обратно в open при ошибке.
+    """
+
+    def __init__(self, name: str, error_rate: float = BREAKER_ERROR_RATE, window: int = BREAKER_WINDOW,
+                 min_calls: int = BREAKER_MIN_CALLS, cooldown: float = BREAKER_COOLDOWN):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self._results = deque(maxlen=window)
+        self._latencies = deque(maxlen=200)
+        self._probe_in_flight = False
+        metrics.openrouter_breaker_state.set(BREAKER_STATES[self.state], name)
+
+    def allow(self) -> bool:
+        if self.state == 'closed':
+            return True
+        if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+            self._set_state('half_open')
+        if self.state == 'half_open' and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def release_probe(self):
+        """Пробный вызов прерван без результата (отмена) - следующий вызов снова может стать пробным"""
+        self._probe_in_flight = False
+
+    def record(self, success: bool, latency: float = None):
+        if latency is not None:
+            self._latencies.append(latency)
+        self._results.append(success)
+
+        if self.state == 'half_open':
+            self._probe_in_flight = False
+            if success:
+                self._results.clear()
+                self._set_state('closed')
+            else:
+                self._open()
+        elif self.state == 'closed' and len(self._results) >= self.min_calls:
+            failures = self._results.count(False)
+            if failures / len(self._results) > self.error_rate:
+                self._open()
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        return {
+            'state': self.state,
+            'calls': len(self._results),
+            'errors': self._results.count(False),
+            'latency_p50': latencies[len(latencies) // 2] if latencies else None,
+            'latency_p95': latencies[int(len(latencies) * 0.95)] if latencies else None,
+        }
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self._set_state('open')
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logging.warning(f"Circuit breaker {self.name}: {self.state} -> {state}")
+            self.state = state
+            metrics.openrouter_breaker_state.set(BREAKER_STATES[state], self.name)
+
+
+_breakers = {}
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    if model not in _breakers:
+        _breakers[model] = CircuitBreaker(model)
+    return _breakers[model]
+
+
+def models_chain(model: str = None) -> list:
+    """Основная модель и резервные по порядку, без повторов"""
+    chain = [model or OPENROUTER_MODEL] + OPENROUTER_FALLBACK_MODELS
+    return list(dict.fromkeys(chain))
+
+
+def stats() -> dict:
+    """Состояние breaker'ов и задержки по моделям"""
+    return {model: breaker.stats() for model, breaker in _breakers.items()}
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response]) -> Optional[float]:
+    """Задержка перед повтором: Retry-After, если сервер его прислал, иначе экспонента с jitter.
+
+    None - сервер просит ждать дольше OPENROUTER_BACKOFF_MAX: повторять эту модель раньше
+    нельзя, лучше перейти к резервной.
+    """
+    if response is not None:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                delay = max(delay, 0.0)
+                return delay if delay <= OPENROUTER_BACKOFF_MAX else None
+
+    return random.uniform(0, min(OPENROUTER_BACKOFF_MAX, OPENROUTER_BACKOFF_BASE * 2 ** attempt))
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUSES
+    return isinstance(error, httpx.TransportError)
+
+
+async def _with_retries(request, model: str):
+    """Выполняет request() с повторами; результат и ошибки учитываются breaker'ом модели"""
+    breaker = get_breaker(model)
+
+    for attempt in range(OPENROUTER_MAX_RETRIES + 1):
+        started = time.monotonic()
+        try:
+            with tracing.span('openrouter', model=model, attempt=attempt):
+                result = await request()
+            latency = time.monotonic() - started
+            breaker.record(True, latency)
+            metrics.openrouter_duration.observe(latency, model, 'ok')
+            return result
+
+        except Exception as e:
+            latency = time.monotonic() - started
+            breaker.record(False, latency)
+            metrics.openrouter_duration.observe(latency, model, 'error')
+            if not _is_retryable(e) or attempt == OPENROUTER_MAX_RETRIES or breaker.state == 'open':
+                raise
+
+            response = e.response if isinstance(e, httpx.HTTPStatusError) else None
+            delay = _retry_delay(attempt, response)
+            if delay is None:
+                logging.warning(f"OpenRouter {model}: Retry-After {response.headers['Retry-After']} "
+                                f"exceeds {OPENROUTER_BACKOFF_MAX}s, giving up on this model")
+                raise
+            logging.warning(f"OpenRouter {model} failed ({e}), retry {attempt + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+        except BaseException:
+            # Отмена (CancelledError) ничего не говорит о модели, но пробный вызов half_open
+            # нужно освободить: иначе allow() больше никогда не пропустит запрос к ней
+            breaker.release_probe()
+            raise
+
+
+async def _request_completion(prompt: str, model: str) -> str:
+    response = await get_client().post(OPENROUTER_API_URL, json=build_payload(prompt, model))
+    response.raise_for_status()
+
+    data = response.json()
+    metrics.record_usage(model, data.get("usage"))
+    return data["choices"][0]["message"]["content"]
+
+
+async def complete(prompt: str, model: str = None) -> str:
+    """Запрос к OpenRouter с повторами и переходом на резервные модели.
+
+    Если ни одна модель не ответила, выбрасывает AIUnavailable.
+    """
+    last_error = None
+    for candidate in models_chain(model):
+        if not get_breaker(candidate).allow():
+            continue
+        try:
+            return await _with_retries(lambda: _request_completion(prompt, candidate), candidate)
+        except Exception as e:
+            logging.error(f"OpenRouter model {candidate} unavailable: {e}")
+            last_error = e
+
+    raise AIUnavailable(str(last_error) if last_error else "all circuit breakers are open") from last_error
+
+
+async def _open_stream(prompt: str, model: str):
+    payload = build_payload(prompt, model)
+    payload["stream"] = True
+
+    request = get_client().build_request("POST", OPENROUTER_API_URL, json=payload)
+    response = await get_client().send(request, stream=True)
+    try:
+        response.raise_for_status()
+    except httpx.HTTPStatusError:
+        await response.aclose()
+        raise
+    return response
+
+
+async def stream(prompt: str, model: str = None) -> AsyncIterator[str]:
+    """Потоковый запрос к OpenRouter (SSE): отдает фрагменты текста по мере генерации.
+
+    Повторы и резервные модели применяются только до начала ответа: после первого
+    фрагмента ошибка пробрасывается вызывающему.
+    """
+    response = None
+    last_error = None
+    for candidate in models_chain(model):
+        if not get_breaker(candidate).allow():
+            continue
+        try:
+            response = await _with_retries(lambda: _open_stream(prompt, candidate), candidate)
+            break
+        except Exception as e:
+            logging.error(f"OpenRouter model {candidate} unavailable: {e}")
+            last_error = e
+
+    if response is None:
+        raise AIUnavailable(str(last_error) if last_error else "all circuit breakers are open") from last_error
+
+    try:
+        async for line in response.aiter_lines():
+            # Строки-комментарии (": OPENROUTER PROCESSING") и пустые разделители пропускаем
+            if not line.startswith("data:"):
+                continue
+
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+
+            chunk = json.loads(data)
+            if "error" in chunk:
+                raise RuntimeError(chunk["error"].get("message", "stream error"))
+            # OpenRouter присылает usage в последнем фрагменте
+            metrics.record_usage(candidate, chunk.get("usage"))
+
+            if not chunk.get("choices"):
+                continue
+
+            content = chunk["choices"][0].get("delta", {}).get("content")
+            if content:
+                yield content
+    finally:
+        await response.aclose()
@@ -0,0 +1,64 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+
+from config import AI_MAX_CONCURRENT, AI_MAX_QUEUE
+
+
+class AIQueueFull(Exception):
+    """Очередь AI-запросов заполнена - запрос отклонен"""
+
+
+class AIGate:
+    """Ограничивает число одновременных вызовов AI, остальные ждут в очереди FIFO"""
+
+    def __init__(self, max_concurrent: int, max_queue: int):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.running = 0
+        self._waiters = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @asynccontextmanager
+    async def slot(self, on_queued: Optional[Callable[[int], Awaitable]] = None):
+        """Занимает слот; если все заняты - встает в очередь и сообщает позицию через on_queued"""
+        if self.running < self.max_concurrent and not self._waiters:
+            self.running += 1
+        else:
+            if len(self._waiters) >= self.max_queue:
+                raise AIQueueFull()
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                if on_queued is not None:
+                    await on_queued(len(self._waiters))
+                # Слот передается напрямую из release(), running не меняется
+                await waiter
+            except BaseException:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # Слот уже был передан нам - отдаем следующему
+                    self._release()
+                raise
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.running -= 1
+
+
+gate = AIGate(AI_MAX_CONCURRENT, AI_MAX_QUEUE)
@@ -0,0 +1,197 @@
+"""Итоги для листов Excel отчета: aggregation.py против pandas.
+
+Для 1k, 100k и 1M синтетических операций (строки как из курсора SQLite)
+считает сводку по категориям и статистику по типам:
+- pandas: groupby, как прежний create_excel_file (эталон);
+- naive: обычные суммы в одном проходе (реализация до aggregation.py);
+- aggregation: aggregation.Totals через iter_detail (один проход с компенсацией ошибок);
+- numpy: в проходе копятся массивы номеров категорий и сумм, итоги - векторно
+  (проверка варианта "NumPy для больших пользователей").
+Каждый замер - в отдельном процессе; печатает время, прирост пикового RSS
+и число значений (после округления до копеек), не совпавших с pandas.
+Нужны pandas и numpy: pip install -r benchmarks/requirements.txt
+
+    python benchmarks/bench_aggregation.py --sizes 1000 100000 1000000
+"""
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from array import array
+from collections import deque
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+CATEGORIES = {
+    'income': ['Зарплата', 'Фриланс', 'Инвестиции', 'Подарки'],
+    'expense': ['Еда', 'Транспорт', 'Жилье', 'Развлечения', 'Здоровье', 'Одежда', 'Образование'],
+}
+ENGINES = ('pandas', 'naive', 'aggregation', 'numpy')
+
+
+def make_rows(count: int):
+    random.seed(count)
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        tr_type = 'income' if random.random() < 0.2 else 'expense'
+        rows.append((database.format_date(start + timedelta(seconds=31 * i)), tr_type,
+                     random.choice(CATEGORIES[tr_type]), round(random.uniform(10, 50000), 2), 'операция'))
+    return rows
+
+
+def run_pandas(rows):
+    import pandas as pd
+
+    df = pd.DataFrame(rows, columns=['date', 'type', 'category', 'amount', 'description'])
+    df['Дата'] = pd.to_datetime(df['date']).dt.strftime('%d.%m.%Y %H:%M')
+    summary = df.groupby(['type', 'category'])['amount'].agg(['sum', 'count']).round(2)
+    stats = df.groupby('type')['amount'].agg(['sum', 'count', 'mean', 'max', 'min']).round(2)
+    return (
+        [[tr_type, category, total, int(count)] for (tr_type, category), (total, count) in summary.iterrows()],
+        [[tr_type, total, int(count), mean, maximum, minimum]
+         for tr_type, (total, count, mean, maximum, minimum) in stats.iterrows()],
+    )
+
+
+def run_naive(rows):
+    by_category = {}
+    by_type = {}
+    for date, tr_type, category, amount, description in rows:
+        date_str = f"{date[8:10]}.{date[5:7]}.{date[0:4]} {date[11:16]}"  # noqa: F841
+        totals = by_category.setdefault((tr_type, category), [0.0, 0])
+        totals[0] += amount
+        totals[1] += 1
+        totals = by_type.setdefault(tr_type, [0.0, 0, amount, amount])
+        totals[0] += amount
+        totals[1] += 1
+        totals[2] = max(totals[2], amount)
+        totals[3] = min(totals[3], amount)
+    return (
+        [[tr_type, category, round(total, 2), count] for (tr_type, category), (total, count) in sorted(by_category.items())],
+        [[tr_type, round(total, 2), count, round(total / count, 2), round(maximum, 2), round(minimum, 2)]
+         for tr_type, (total, count, maximum, minimum) in sorted(by_type.items())],
+    )
+
+
+def run_aggregation(rows):
+    import aggregation
+
+    totals = aggregation.Totals()
+    # Детальные строки в отчете сразу уходят в лист; здесь - просто расходуются
+    deque(aggregation.iter_detail(rows, totals), maxlen=0)
+    return (
+        [[t.type, t.category, round(t.total, 2), t.count] for t in totals.category_totals()],
+        [[s.type, round(s.total, 2), s.count, round(s.mean, 2), round(s.maximum, 2), round(s.minimum, 2)]
+         for s in totals.type_stats()],
+    )
+
+
+def run_numpy(rows):
+    import numpy as np
+
+    keys = {}
+    codes = array('i')
+    amounts = array('d')
+    for date, tr_type, category, amount, description in rows:
+        date_str = f"{date[8:10]}.{date[5:7]}.{date[0:4]} {date[11:16]}"  # noqa: F841
+        code = keys.get((tr_type, category))
+        if code is None:
+            code = keys[(tr_type, category)] = len(keys)
+        codes.append(code)
+        amounts.append(amount)
+
+    codes = np.frombuffer(codes, dtype=np.int32)
+    amounts = np.frombuffer(amounts, dtype=np.float64)
+    order = np.argsort(codes, kind='stable')
+    amounts = amounts[order]
+    counts = np.bincount(codes, minlength=len(keys))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    maximums = np.maximum.reduceat(amounts, starts)
+    minimums = np.minimum.reduceat(amounts, starts)
+    groups = {
+        key: (math.fsum(amounts[starts[code]:starts[code] + counts[code]].tolist()), int(counts[code]),
+              float(maximums[code]), float(minimums[code]))
+        for key, code in keys.items()
+    }
+
+    by_type = {}
+    for (tr_type, _), group in groups.items():
+        by_type.setdefault(tr_type, []).append(group)
+    return (
+        [[tr_type, category, round(total, 2), count]
+         for (tr_type, category), (total, count, _, _) in sorted(groups.items())],
+        [[tr_type, round(total, 2), count, round(total / count, 2),
+          round(max(g[2] for g in items), 2), round(min(g[3] for g in items), 2)]
+         for tr_type, items in sorted(by_type.items())
+         for total, count in [(math.fsum(g[0] for g in items), sum(g[1] for g in items))]],
+    )
+
+
+def measure(engine: str, count: int):
+    """Запускается в дочернем процессе: печатает JSON с замером и результатом"""
+    rows = make_rows(count)
+    if engine == 'pandas':
+        import pandas  # noqa: F401  импорт в замер не входит
+    elif engine == 'numpy':
+        import numpy  # noqa: F401
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if engine == 'pandas':
+        result = run_pandas(rows)
+    elif engine == 'naive':
+        result = run_naive(rows)
+    elif engine == 'numpy':
+        result = run_numpy(rows)
+    else:
+        result = run_aggregation(rows)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    print(json.dumps({'seconds': elapsed, 'peak_mb': peak / 1024, 'result': result}))
+
+
+def mismatches(result, reference) -> int:
+    return sum(
+        value != expected
+        for rows, expected_rows in zip(result, reference)
+        for row, expected_row in zip(rows, expected_rows)
+        for value, expected in zip(row, expected_row)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--measure', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure[0], int(args.measure[1]))
+        return
+
+    for count in args.sizes:
+        results = {}
+        for engine in ENGINES:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--measure', engine, str(count)],
+                                    check=True, capture_output=True, text=True).stdout
+            results[engine] = json.loads(output)
+
+        reference = results['pandas']['result']
+        for engine in ENGINES:
+            measured = results[engine]
+            print(f"{count:>8} rows  {engine:11} {measured['seconds'] * 1000:9.1f} ms  "
+                  f"peak +{measured['peak_mb']:6.1f} MB  "
+                  f"mismatches vs pandas: {mismatches(measured['result'], reference)}")
+
+
+if __name__ == '__main__':
+    main()
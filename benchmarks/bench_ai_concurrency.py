@@ -0,0 +1,57 @@
+"""Проверка, что запросы к AI не блокируют друг друга.
+
+N параллельных вызовов ai_client.complete() к заглушке с задержкой D
+должны завершиться примерно за D, а не за N * D.
+
+    python benchmarks/bench_ai_concurrency.py --requests 20 --delay 0.5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_openrouter import StubOpenRouter  # noqa: E402
+
+
+async def run(n: int) -> float:
+    import ai_client
+
+    # Прогрев: открываем соединение, чтобы не мерить handshake
+    await ai_client.complete('ping')
+
+    start = time.perf_counter()
+    await asyncio.gather(*(ai_client.complete(f'prompt {i}') for i in range(n)))
+    elapsed = time.perf_counter() - start
+
+    await ai_client.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--delay', type=float, default=0.5)
+    args = parser.parse_args()
+
+    with StubOpenRouter(delay=args.delay) as stub:
+        os.environ['OPENROUTER_API_URL'] = stub.url
+        os.environ.setdefault('OPENROUTER_MODEL', 'stub/model')
+        os.environ['OPENROUTER_MAX_CONNECTIONS'] = str(max(args.requests, 1))
+
+        elapsed = asyncio.run(run(args.requests))
+
+    print(f'{args.requests} параллельных запросов: {elapsed:.2f} c '
+          f'(один запрос: {args.delay:.2f} c, последовательно: {args.requests * args.delay:.2f} c)')
+
+    # Допускаем двукратный запас на накладные расходы
+    if elapsed > args.delay * 2:
+        print('FAIL: запросы выполняются последовательно')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Сценарии отказов OpenRouter против заглушки с внедрением ошибок.
+
+Проверяет повторы с учетом Retry-After (и переход на резервную модель, если
+сервер просит ждать дольше OPENROUTER_BACKOFF_MAX), переход на резервную модель,
+размыкание circuit breaker (быстрый отказ) и его восстановление, в том числе
+после отмены пробного запроса.
+
+    python benchmarks/bench_ai_resilience.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_openrouter import StubOpenRouter  # noqa: E402
+
+PRIMARY = 'primary/model'
+BACKUP = 'backup/model'
+
+
+def check(name, condition, details=''):
+    print(f"{'OK  ' if condition else 'FAIL'} {name} {details}")
+    return condition
+
+
+async def scenarios(stub) -> bool:
+    import ai_client
+
+    ok = True
+
+    # 1. Разовый 429 с Retry-After: запрос повторяется после паузы и успешно завершается
+    stub.set_failure(PRIMARY, 429)
+    stub.set_retry_after(1)
+    asyncio.get_running_loop().call_later(0.2, stub.set_failure, PRIMARY, None)
+    started = time.perf_counter()
+    await ai_client.complete('prompt')
+    elapsed = time.perf_counter() - started
+    ok &= check('429 + Retry-After', 1.0 <= elapsed < 2.0, f'{elapsed:.2f}s')
+    stub.set_retry_after(None)
+
+    # 1b. Retry-After дольше OPENROUTER_BACKOFF_MAX: основная модель не повторяется раньше
+    #     срока, ответ сразу приходит от резервной
+    stub.set_failure(PRIMARY, 429)
+    stub.set_retry_after(60)
+    primary_before, backup_before = stub.model_requests[PRIMARY], stub.model_requests[BACKUP]
+    started = time.perf_counter()
+    await ai_client.complete('prompt')
+    elapsed = time.perf_counter() - started
+    ok &= check('long Retry-After -> fallback', stub.model_requests[PRIMARY] == primary_before + 1
+                and stub.model_requests[BACKUP] == backup_before + 1 and elapsed < 1.0, f'{elapsed:.2f}s')
+    stub.set_retry_after(None)
+    stub.set_failure(PRIMARY, None)
+
+    # 2. Основная модель отдает 503: ответ приходит от резервной
+    stub.set_failure(PRIMARY, 503)
+    before = stub.model_requests[BACKUP]
+    await ai_client.complete('prompt')
+    ok &= check('fallback model', stub.model_requests[BACKUP] == before + 1)
+
+    # 3. После серии ошибок breaker основной модели размыкается и ее больше не вызывают
+    for _ in range(5):
+        await ai_client.complete('prompt')
+    primary_calls = stub.model_requests[PRIMARY]
+    started = time.perf_counter()
+    await ai_client.complete('prompt')
+    elapsed = time.perf_counter() - started
+    ok &= check('breaker open', ai_client.get_breaker(PRIMARY).state == 'open'
+                and stub.model_requests[PRIMARY] == primary_calls, f'{elapsed * 1000:.0f}ms')
+
+    # 4. Все модели недоступны: после размыкания отказ мгновенный
+    stub.set_failure(BACKUP, 503)
+    for _ in range(5):
+        try:
+            await ai_client.complete('prompt')
+        except ai_client.AIUnavailable:
+            pass
+    started = time.perf_counter()
+    try:
+        await ai_client.complete('prompt')
+        failed_fast = False
+    except ai_client.AIUnavailable:
+        failed_fast = True
+    elapsed = time.perf_counter() - started
+    ok &= check('fail fast', failed_fast and elapsed < 0.01, f'{elapsed * 1000:.2f}ms')
+
+    # 5. Восстановление: после cooldown пробный запрос замыкает breaker; отмененный
+    #    пробный запрос не блокирует следующий
+    stub.set_failure(PRIMARY, None)
+    stub.set_failure(BACKUP, None)
+    await asyncio.sleep(float(os.environ['BREAKER_COOLDOWN']))
+    probe = asyncio.ensure_future(ai_client.complete('prompt'))
+    await asyncio.sleep(0.01)
+    probe.cancel()
+    try:
+        await probe
+    except asyncio.CancelledError:
+        pass
+    await ai_client.complete('prompt')
+    ok &= check('breaker recovery', ai_client.get_breaker(PRIMARY).state == 'closed')
+
+    print(ai_client.stats())
+    await ai_client.close()
+    return ok
+
+
+def main():
+    with StubOpenRouter(delay=0.05) as stub:
+        os.environ.update(
+            OPENROUTER_API_URL=stub.url,
+            OPENROUTER_MODEL=PRIMARY,
+            OPENROUTER_FALLBACK_MODELS=BACKUP,
+            OPENROUTER_BACKOFF_BASE='0.05',
+            BREAKER_MIN_CALLS='5',
+            BREAKER_COOLDOWN='1',
+        )
+        ok = asyncio.run(scenarios(stub))
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
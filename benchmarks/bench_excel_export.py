@@ -0,0 +1,277 @@
+"""Сравнение потоковой выгрузки Excel с прежней реализацией на pandas.
+
+Заполняет временную базу N операциями одного пользователя, строит отчет
+обеими реализациями (каждая в отдельном процессе) и печатает время и пиковую
+память (прирост ru_maxrss), затем сверяет значения ячеек во всех листах.
+Нужен pandas: pip install -r benchmarks/requirements.txt
+
+    python benchmarks/bench_excel_export.py --rows 100000
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+USER_ID = 1
+CATEGORIES = {
+    'income': ['Зарплата', 'Фриланс', 'Инвестиции', 'Подарки'],
+    'expense': ['Еда', 'Транспорт', 'Жилье', 'Развлечения', 'Здоровье', 'Одежда', 'Образование'],
+}
+
+
+def seed(db_path: str, rows: int, start: datetime, end: datetime):
+    conn = sqlite3.connect(db_path)
+    database._migrate(conn)
+    span = (end - start).total_seconds()
+    data = []
+    for _ in range(rows):
+        tr_type = 'income' if random.random() < 0.2 else 'expense'
+        date = start + timedelta(seconds=random.uniform(0, span))
+        data.append((USER_ID, round(random.uniform(10, 5000), 2), tr_type,
+                     random.choice(CATEGORIES[tr_type]), 'операция', database.format_date(date)))
+    conn.executemany('''
+        INSERT INTO transactions (user_id, amount, type, category, description, date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', data)
+    conn.commit()
+    conn.close()
+
+
+def legacy_build_excel_report(db_path: str, user_id: int, start_date: datetime, end_date: datetime,
+                       period: str, output_dir: str) -> Optional[str]:
+    """Прежняя реализация через pandas.DataFrame и pd.ExcelWriter (для сравнения)"""
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        rows = list(database.iter_transactions_between(conn, user_id, start_date, end_date))
+    finally:
+        conn.close()
+
+    df = pd.DataFrame(rows, columns=['date', 'type', 'category', 'amount', 'description'])
+
+    if df.empty:
+        return None
+
+    # Преобразуем дату
+    df['date'] = pd.to_datetime(df['date'])
+    df['Дата'] = df['date'].dt.strftime('%d.%m.%Y %H:%M')
+
+    # Переименовываем колонки для лучшей читаемости
+    df = df.rename(columns={
+        'type': 'Тип',
+        'category': 'Категория',
+        'amount': 'Сумма',
+        'description': 'Описание'
+    })
+
+    # Создаем Excel файл
+    filename = f"finance_report_{user_id}_{period}.xlsx"
+    filepath = os.path.join(output_dir, filename)
+
+    with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
+        # ===== ЛИСТ 1: ДЕТАЛЬНЫЕ ДАННЫЕ =====
+        detailed_df = df[['Дата', 'Тип', 'Категория', 'Сумма', 'Описание']].copy()
+        detailed_df['Тип'] = detailed_df['Тип'].map({'income': 'Доход', 'expense': 'Расход'})
+        detailed_df.to_excel(writer, sheet_name='Детальные данные', index=False)
+
+        # Форматирование листа с детальными данными
+        worksheet = writer.sheets['Детальные данные']
+
+        # Устанавливаем ширину колонок
+        column_widths = [20, 10, 15, 15, 30]
+        for i, width in enumerate(column_widths, 1):
+            worksheet.column_dimensions[chr(64 + i)].width = width
+
+        # Добавляем заголовки жирным шрифтом
+        for col_num, value in enumerate(detailed_df.columns, 1):
+            cell = worksheet.cell(row=1, column=col_num)
+            cell.font = cell.font.copy(bold=True)
+
+        # Добавляем форматирование для сумм
+        for row in range(2, len(detailed_df) + 2):
+            cell = worksheet.cell(row=row, column=4)  # Колонка Сумма
+            cell.number_format = '#,##0.00" руб"'
+
+            # Цветовое кодирование: доходы - зеленый, расходы - красный
+            type_cell = worksheet.cell(row=row, column=2)  # Колонка Тип
+            if type_cell.value == 'Доход':
+                cell.font = cell.font.copy(color='FF008000')  # Зеленый
+            else:
+                cell.font = cell.font.copy(color='FFFF0000')  # Красный
+
+        # ===== ЛИСТ 2: СВОДКА ПО КАТЕГОРИЯМ =====
+        summary = df.groupby(['Тип', 'Категория']).agg({
+            'Сумма': ['sum', 'count']
+        }).round(2)
+        summary.columns = ['Сумма', 'Количество операций']
+        summary = summary.reset_index()
+        summary['Тип'] = summary['Тип'].map({'income': 'Доход', 'expense': 'Расход'})
+
+        summary.to_excel(writer, sheet_name='Сводка по категориям', index=False)
+
+        # Форматирование листа сводки
+        worksheet_summary = writer.sheets['Сводка по категориям']
+
+        # Ширина колонок
+        column_widths_summary = [10, 15, 15, 20]
+        for i, width in enumerate(column_widths_summary, 1):
+            worksheet_summary.column_dimensions[chr(64 + i)].width = width
+
+        # Жирные заголовки
+        for col_num, value in enumerate(summary.columns, 1):
+            cell = worksheet_summary.cell(row=1, column=col_num)
+            cell.font = cell.font.copy(bold=True)
+
+        # Форматирование сумм
+        for row in range(2, len(summary) + 2):
+            cell = worksheet_summary.cell(row=row, column=3)  # Колонка Сумма
+            cell.number_format = '#,##0.00" руб"'
+
+            cell = worksheet_summary.cell(row=row, column=4)  # Колонка Количество операций
+            cell.number_format = '0'
+
+        # ===== ЛИСТ 3: ОБЩАЯ СТАТИСТИКА =====
+        stats = df.groupby('Тип').agg({
+            'Сумма': ['sum', 'count', 'mean', 'max', 'min']
+        }).round(2)
+        stats.columns = ['Общая сумма', 'Количество операций', 'Средняя сумма', 'Максимальная сумма', 'Минимальная сумма']
+        stats = stats.reset_index()
+        stats['Тип'] = stats['Тип'].map({'income': 'Доход', 'expense': 'Расход'})
+
+        # Добавляем итоги
+        total_income = stats[stats['Тип'] == 'Доход']['Общая сумма'].sum()
+        total_expense = stats[stats['Тип'] == 'Расход']['Общая сумма'].sum()
+        balance = total_income - total_expense
+
+        stats.to_excel(writer, sheet_name='Общая статистика', index=False)
+
+        # Форматирование листа статистики
+        worksheet_stats = writer.sheets['Общая статистика']
+
+        # Ширина колонок
+        column_widths_stats = [15, 15, 20, 15, 20, 20]
+        for i, width in enumerate(column_widths_stats, 1):
+            worksheet_stats.column_dimensions[chr(64 + i)].width = width
+
+        # Жирные заголовки
+        for col_num, value in enumerate(stats.columns, 1):
+            cell = worksheet_stats.cell(row=1, column=col_num)
+            cell.font = cell.font.copy(bold=True)
+
+        # Форматирование чисел
+        for row in range(2, len(stats) + 2):
+            for col in range(2, 7):  # Колонки с числами
+                cell = worksheet_stats.cell(row=row, column=col)
+                if col == 3:  # Количество операций
+                    cell.number_format = '0'
+                else:
+                    cell.number_format = '#,##0.00" руб"'
+
+        # Добавляем строку с балансом
+        balance_row = len(stats) + 3
+        worksheet_stats.cell(row=balance_row, column=1, value='БАЛАНС:').font = cell.font.copy(bold=True)
+        worksheet_stats.cell(row=balance_row, column=2, value=balance).number_format = '#,##0.00" руб"'
+
+        if balance >= 0:
+            worksheet_stats.cell(row=balance_row, column=2).font = cell.font.copy(color='FF008000')
+        else:
+            worksheet_stats.cell(row=balance_row, column=2).font = cell.font.copy(color='FFFF0000')
+
+    return filepath
+
+
+def measure(impl: str, db_path: str, start: datetime, end: datetime, output_dir: str):
+    """Запускается в дочернем процессе: строит отчет и печатает JSON с замерами"""
+    if impl == 'legacy':
+        global pd
+        import pandas as pd
+        build = legacy_build_excel_report
+    else:
+        import reports
+
+        def build(db_path, user_id, start, end, period, output_dir):
+            content = reports.build_excel_report(db_path, user_id, start, end)
+            filepath = os.path.join(output_dir, f"finance_report_{user_id}_{period}.xlsx")
+            with open(filepath, 'wb') as file:
+                file.write(content)
+            return filepath
+
+    # ru_maxrss в килобайтах (Linux); импорт библиотек в замер не входит
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    path = build(db_path, USER_ID, start, end, impl, output_dir)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    print(json.dumps({'path': path, 'seconds': elapsed, 'peak_mb': peak / 1024}))
+
+
+def read_values(path: str) -> dict:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True)
+    values = {}
+    for sheet in workbook.worksheets:
+        rows = values[sheet.title] = []
+        for row in sheet.iter_rows(values_only=True):
+            # Пустые хвосты строк зависят от размеров листа, а не от данных
+            row = [round(v, 2) if isinstance(v, float) else v for v in row]
+            while row and row[-1] is None:
+                row.pop()
+            if row:
+                rows.append(tuple(row))
+    workbook.close()
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--measure', nargs=5, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        impl, db_path, start, end, output_dir = args.measure
+        measure(impl, db_path, datetime.fromisoformat(start), datetime.fromisoformat(end), output_dir)
+        return
+
+    end = datetime.now().replace(microsecond=0)
+    start = end - timedelta(days=365)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        seed(db_path, args.rows, start, end)
+        print(f"rows: {args.rows}")
+
+        results = {}
+        for impl in ('legacy', 'streaming'):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--measure',
+                 impl, db_path, start.isoformat(), end.isoformat(), tmp],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[impl] = json.loads(output.strip().splitlines()[-1])
+            print(f"{impl:>10}: {results[impl]['seconds']:.2f}s, peak {results[impl]['peak_mb']:.1f} MB")
+
+        legacy, streaming = (read_values(results[impl]['path']) for impl in ('legacy', 'streaming'))
+        if legacy != streaming:
+            for title in legacy:
+                for old, new in zip(legacy[title], streaming.get(title, [])):
+                    if old != new:
+                        print(f"MISMATCH in sheet {title!r}: {old} != {new}")
+            sys.exit(1)
+        print("identical cell values: OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Пропускная способность добавления операций: коммит на каждую запись против group commit.
+
+M пользователей параллельно добавляют по N операций (как save_transaction:
+каждый ждет подтверждения записи перед следующей). Сравниваются:
+- отдельная транзакция на операцию при synchronous=NORMAL (настройка пула,
+  без fsync на коммит - запись может пропасть при сбое питания);
+- отдельная транзакция на операцию при synchronous=FULL (fsync на каждую запись);
+- database.add_transaction через GroupCommitWriter (FULL, один fsync на пачку).
+Перед замером проверяет, что пачки писателя не попадают в трассу обновления,
+из которого он был запущен.
+
+    python benchmarks/bench_group_commit.py --users 200 --per-user 20
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def insert_all(users: int, per_user: int, add) -> float:
+    async def user(user_id):
+        for i in range(per_user):
+            await add(user_id, 100.0 + i, 'expense', '🍔 Еда', f'bench {i}')
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(user_id) for user_id in range(1, users + 1)))
+    return time.perf_counter() - started
+
+
+def count_spans(span) -> int:
+    return 1 + sum(count_spans(child) for child in span.children)
+
+
+async def check_trace_isolation(writes: int = 50):
+    """Писатель запускается первой записью внутри трассы; последующие записи не должны ее увеличивать"""
+    import database
+    import tracing
+
+    with tracing.Trace('first update', threshold=float('inf')) as trace:
+        await database.add_transaction(1, 1.0, 'expense', '🍔 Еда', 'traced')
+    spans = count_spans(trace.root)
+    for i in range(writes):
+        await database.add_transaction(1, 1.0, 'expense', '🍔 Еда', f'untraced {i}')
+    assert count_spans(trace.root) == spans, (spans, count_spans(trace.root))
+    print(f"trace isolation: OK ({spans} spans before and after {writes} writes)")
+    return writes + 1
+
+
+async def run(args):
+    import database
+
+    database.init_db()
+    extra = await check_trace_isolation()
+    total = args.users * args.per_user
+
+    async def per_row(*values):
+        await database.run(database._add_transaction, *values)
+
+    async def per_row_durable(*values):
+        await database.run_durable(database._add_transaction, *values)
+
+    for label, add in (('per-row commit, NORMAL', per_row), ('per-row commit, FULL', per_row_durable),
+                       ('group commit, FULL', database.add_transaction)):
+        elapsed = await insert_all(args.users, args.per_user, add)
+        print(f"{label:24} {total / elapsed:8.0f} inserts/s ({elapsed:.2f}s)")
+    print(f"group commit stats: {database.writer.stats()}")
+
+    database.close()
+    with sqlite3.connect(database.DB_PATH) as conn:
+        count, summary = conn.execute(
+            'SELECT (SELECT COUNT(*) FROM transactions), (SELECT SUM(count) FROM transaction_summary)'
+        ).fetchone()
+    assert count == summary == total * 3 + extra, (count, summary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--per-user', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        os.environ['HOME'] = home
+        asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Импорт выписок: скорость и память на больших файлах.
+
+Генерирует выписку банка (CSV в cp1251 с ';', знак суммы вместо типа) на N строк,
+импортирует ее, затем импортирует повторно (все строки должны оказаться
+дубликатами). После этого выгружает операции отчетами бота (CSV и Excel) и
+импортирует их обратно - тоже без новых операций. Печатает время и прирост
+пикового RSS процесса.
+
+    python benchmarks/bench_import.py --rows 100000
+"""
+import argparse
+import csv
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CATEGORIES = {
+    'income': ['💼 Зарплата', '👨‍💻 Фриланс', '🎁 Подарок', '📈 Инвестиции', '🏆 Премия', '📱 Прочее'],
+    'expense': ['🍔 Еда', '🚗 Транспорт', '🏠 Жилье', '🎬 Развлечения', '🏥 Здоровье', '🎓 Образование',
+                '👕 Одежда', '📱 Прочее'],
+}
+BANK_CATEGORIES = ['Еда', 'Транспорт', 'Супермаркеты', 'Зарплата', 'Переводы', 'Одежда']
+
+USER_ID = 42
+
+
+def make_statement(path: str, rows: int):
+    started = datetime(2024, 1, 1)
+    with open(path, 'w', encoding='cp1251', newline='') as file:
+        writer = csv.writer(file, delimiter=';')
+        writer.writerow(['Выписка по счету 40817810000000000000'])
+        writer.writerow([])
+        writer.writerow(['Дата операции', 'Категория', 'Описание', 'Сумма операции'])
+        for i in range(rows):
+            date = started + timedelta(minutes=7 * i)
+            category = random.choice(BANK_CATEGORIES)
+            amount = random.randint(100, 500000) / 100
+            if category != 'Зарплата':
+                amount = -amount
+            writer.writerow([date.strftime('%d.%m.%Y %H:%M:%S'), category, f'Операция {i}',
+                             f'{amount:.2f}'.replace('.', ',')])
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timed_import(label: str, path: str, fmt: str):
+    import database
+    import importer
+
+    rss = max_rss_mb()
+    started = time.perf_counter()
+    result = importer.import_file(database.DB_PATH, path, fmt, USER_ID, CATEGORIES)
+    elapsed = time.perf_counter() - started
+    print(f"{label:28} {elapsed:6.2f}s, peak RSS +{max_rss_mb() - rss:5.1f} MB, {result}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        os.environ['HOME'] = home
+        import database
+        import reports
+
+        database.init_db()
+        statement = os.path.join(home, 'statement.csv')
+        make_statement(statement, args.rows)
+        print(f"statement: {args.rows} rows, {os.path.getsize(statement) / 1024 / 1024:.1f} MB")
+
+        result = timed_import('bank CSV', statement, 'csv')
+        assert result.imported == args.rows, result
+        result = timed_import('bank CSV again', statement, 'csv')
+        assert result.imported == 0 and result.duplicates == args.rows, result
+
+        start, end = datetime(2000, 1, 1), datetime(2100, 1, 1)
+        for fmt, build in (('csv', reports.build_csv_report), ('xlsx', reports.build_excel_report)):
+            export = os.path.join(home, f'export.{fmt}')
+            with open(export, 'wb') as file:
+                file.write(build(database.DB_PATH, USER_ID, start, end))
+            result = timed_import(f'bot {fmt.upper()} export', export, fmt)
+            assert result.imported == 0 and result.duplicates == args.rows, result
+
+
+if __name__ == '__main__':
+    main()
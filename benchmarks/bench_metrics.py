@@ -0,0 +1,93 @@
+"""Накладные расходы метрик на одно обновление.
+
+1. Application.process_update() с пустым обработчиком N раз без инструментирования
+   и после metrics.instrument_handlers() - разница на обновление;
+2. стоимость одного наблюдения гистограммы (так замеряется каждый запрос к БД)
+   и database.run() пустого запроса с замером.
+Оценка на обновление: обработчик + 3 запроса к БД. Завершается с кодом 1, если
+она выше --budget-us (по умолчанию 50 мкс).
+
+    python benchmarks/bench_metrics.py --updates 50000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_telegram import StubTelegram, make_update  # noqa: E402
+
+DB_QUERIES_PER_UPDATE = 3
+
+
+
+async def time_updates(application, update, count: int) -> float:
+    best = float('inf')
+    # Лучший из нескольких прогонов - меньше шума от остальной системы
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(count):
+            await application.process_update(update)
+        best = min(best, time.perf_counter() - started)
+    return best / count
+
+
+async def run(args, stub: StubTelegram):
+    from telegram import Update
+    from telegram.ext import Application, MessageHandler, filters
+
+    import database
+    import metrics
+
+    async def noop(update, context):
+        pass
+
+    application = Application.builder().token('123:BENCH').base_url(stub.base_url).updater(None).build()
+    application.add_handler(MessageHandler(filters.TEXT, noop))
+    update = Update.de_json(make_update(1, 1, 'hello'), application.bot)
+
+    # initialize() вызывает getMe - отвечает заглушка; дальше сеть не нужна
+    async with application:
+        plain = await time_updates(application, update, args.updates)
+        metrics.instrument_handlers(application)
+        instrumented = await time_updates(application, update, args.updates)
+    handler_overhead = instrumented - plain
+
+    histogram = metrics.db_query_duration
+    started = time.perf_counter()
+    for _ in range(args.updates):
+        histogram.observe(0.0001, 'bench')
+    observe = (time.perf_counter() - started) / args.updates
+
+    database.init_db()
+    started = time.perf_counter()
+    for _ in range(args.updates // 10):
+        await database.run(database._get_data_version, 1)
+    query = (time.perf_counter() - started) / (args.updates // 10)
+
+    per_update = handler_overhead + DB_QUERIES_PER_UPDATE * observe
+    print(f"process_update, no metrics:   {plain * 1e6:7.1f} us")
+    print(f"process_update, instrumented: {instrumented * 1e6:7.1f} us (+{handler_overhead * 1e6:.1f} us)")
+    print(f"histogram observe:            {observe * 1e6:7.2f} us (database.run total {query * 1e6:.0f} us)")
+    print(f"estimated overhead per update (handler + {DB_QUERIES_PER_UPDATE} DB queries): "
+          f"{per_update * 1e6:.1f} us, budget {args.budget_us:.0f} us")
+    return per_update * 1e6 <= args.budget_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--updates', type=int, default=50000)
+    parser.add_argument('--budget-us', type=float, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home, StubTelegram() as stub:
+        os.environ['HOME'] = home
+        ok = asyncio.run(run(args, stub))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
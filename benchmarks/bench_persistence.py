@@ -0,0 +1,95 @@
+"""Скорость записи и восстановления user_data / состояний диалогов (SQLitePersistence).
+
+Запись: N пользователей сохраняются одним проходом update_persistence (одна
+транзакция) и, для сравнения, отдельной транзакцией на каждого пользователя.
+Восстановление: время загрузки всех данных и полного Application.initialize()
+с настоящими обработчиками бота (Bot API - заглушка).
+
+    python benchmarks/bench_persistence.py --users 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_telegram import StubTelegram  # noqa: E402
+
+USER_DATA_SAMPLES = [
+    {},
+    {'awaiting_period': 'xlsx'},
+    {'awaiting_confirm': True},
+    {'type': 'expense', 'amount': 350.0, 'category': '🍔 Еда'},
+    {'type': 'income', 'amount': 50000.0},
+]
+STATES = [0, 1, 2]  # AMOUNT, CATEGORY, DESCRIPTION
+
+
+async def run(users: int, per_row_sample: int, stub: StubTelegram):
+    from telegram.ext import Application
+
+    import bot
+    import database
+    import persistence
+
+    database.init_db()
+    persistence_obj = persistence.SQLitePersistence()
+    user_ids = range(1, users + 1)
+
+    # ===== Запись: одна транзакция на проход =====
+    started = time.perf_counter()
+    coroutines = [persistence_obj.update_user_data(user_id, random.choice(USER_DATA_SAMPLES)) for user_id in user_ids]
+    coroutines += [
+        persistence_obj.update_conversation('transaction', (user_id, user_id), random.choice(STATES))
+        for user_id in user_ids if user_id % 10 == 0
+    ]
+    await asyncio.gather(*coroutines)
+    batched = time.perf_counter() - started
+    print(f"write, batched:    {users / batched:10.0f} users/s ({batched:.2f}s for {users})")
+
+    # ===== Запись: транзакция на каждого пользователя (прежний способ) =====
+    sample = range(users + 1, users + 1 + per_row_sample)
+    started = time.perf_counter()
+    for user_id in sample:
+        await database.run(persistence._save_batch, {user_id: '{"awaiting_confirm": true}'}, {})
+    per_row = time.perf_counter() - started
+    print(f"write, per row:    {per_row_sample / per_row:10.0f} users/s ({per_row:.2f}s for {per_row_sample})")
+
+    # ===== Восстановление =====
+    started = time.perf_counter()
+    restored = await persistence.SQLitePersistence().get_user_data()
+    conversations = await persistence.SQLitePersistence().get_conversations('transaction')
+    load = time.perf_counter() - started
+    print(f"restore, load:     {load:.2f}s ({len(restored)} users, {len(conversations)} conversations)")
+
+    started = time.perf_counter()
+    shard = await persistence.SQLitePersistence(0, 4).get_user_data()
+    print(f"restore, 1 of 4 shards: {time.perf_counter() - started:.2f}s ({len(shard)} users)")
+
+    builder = (Application.builder().token('123:BENCH').base_url(stub.base_url)
+               .persistence(persistence.SQLitePersistence()).updater(None))
+    application = bot.build_application(builder)
+    started = time.perf_counter()
+    await application.initialize()
+    startup = time.perf_counter() - started
+    print(f"restore, Application.initialize(): {startup:.2f}s ({len(application.user_data)} users)")
+    await application.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--per-row-sample', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home, StubTelegram() as stub:
+        os.environ['HOME'] = home
+        asyncio.run(run(args.users, args.per_row_sample, stub))
+
+
+if __name__ == '__main__':
+    main()
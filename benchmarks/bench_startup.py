@@ -0,0 +1,119 @@
+"""Холодный старт бота: время импорта и время до ответа на первое обновление.
+
+1. `python -X importtime -c "import bot"` несколько раз: медиана общего времени
+   импорта и самые тяжелые модули, которые бот импортирует напрямую.
+2. `python bot.py` в режиме polling с заглушкой Bot API, в которой уже лежит
+   /start: время от запуска процесса до первого sendMessage.
+
+Как регрессионная проверка: тяжелые модули отчетов (openpyxl, pandas, numpy) не
+должны загружаться при старте, а с --max-import-ms / --max-first-update-ms
+скрипт завершается с кодом 1 при превышении порогов.
+
+    python benchmarks/bench_startup.py --runs 5 --max-import-ms 1500 --max-first-update-ms 5000
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stub_telegram import StubTelegram  # noqa: E402
+
+# Нужны только при генерации отчетов и импорте выписок
+LAZY_MODULES = ('openpyxl', 'pandas', 'numpy', 'pyarrow')
+
+
+def import_times(env: dict):
+    """Разбирает вывод -X importtime: (общее время бота в мкс, {модуль: накопленное время}, все модули)"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import bot'], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    total = 0
+    direct = {}
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        module = name.strip()
+        modules.add(module)
+        # Отступ показывает вложенность: два пробела - модуль импортирован самим bot
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and module == 'bot':
+            total = int(cumulative)
+        elif depth == 1:
+            direct[module] = int(cumulative)
+    return total, direct, modules
+
+
+def first_update_time(env: dict, stub: StubTelegram) -> float:
+    stub.updates.append({
+        'update_id': len(stub.updates) + 1,
+        'message': {
+            'message_id': 1, 'date': int(time.time()), 'text': '/start',
+            'chat': {'id': 1, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'User'},
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+        },
+    })
+    sent = stub.calls['sendMessage']
+
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'bot.py'], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while stub.calls['sendMessage'] == sent:
+            if process.poll() is not None:
+                raise RuntimeError(f'bot exited with code {process.returncode}')
+            time.sleep(0.005)
+        return time.perf_counter() - started
+    finally:
+        process.send_signal(signal.SIGINT)
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--max-import-ms', type=float)
+    parser.add_argument('--max-first-update-ms', type=float)
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as home, StubTelegram() as stub:
+        env = dict(os.environ, HOME=home, TOKEN='123:STARTUP', BOT_MODE='polling',
+                   TELEGRAM_API_URL=stub.base_url, CONCURRENT_UPDATES='1')
+
+        runs = [import_times(env) for _ in range(args.runs)]
+        import_ms = statistics.median(total for total, _, _ in runs) / 1000
+        print(f"import bot: {import_ms:.0f} ms (median of {args.runs})")
+        _, direct, modules = runs[-1]
+        for module, cumulative in sorted(direct.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {cumulative / 1000:7.1f} ms  {module}")
+
+        loaded = sorted(module for module in LAZY_MODULES if module in modules)
+        if loaded:
+            print(f"FAIL heavy modules imported at startup: {', '.join(loaded)}")
+            failed = True
+        if args.max_import_ms is not None and import_ms > args.max_import_ms:
+            print(f"FAIL import time above {args.max_import_ms:.0f} ms")
+            failed = True
+
+        # Первый запуск создает базу, поэтому меряем несколько и берем медиану
+        first_update_ms = statistics.median(first_update_time(env, stub) for _ in range(args.runs)) * 1000
+        print(f"time to first update: {first_update_ms:.0f} ms (median of {args.runs})")
+        if args.max_first_update_ms is not None and first_update_ms > args.max_first_update_ms:
+            print(f"FAIL time to first update above {args.max_first_update_ms:.0f} ms")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
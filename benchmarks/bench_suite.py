@@ -0,0 +1,336 @@
+"""Сквозной бенчмарк бота: синтетические пользователи, настоящие обработчики, заглушки API.
+
+1. Заполняет finance.db синтетической историей: --users пользователей по
+   --transactions операций за последние --days дней (итоги transaction_summary
+   пересчитываются так же, как миграцией). С --home база сохраняется между
+   запусками и повторно не заполняется, если параметры не менялись.
+2. Поднимает заглушки Bot API (stub_telegram) и OpenRouter (stub_openrouter) и
+   Application с обработчиками bot.py в той же конфигурации, что в проде
+   (bot.get_builder: persistence, UserOrderedUpdateProcessor).
+3. Для каждого действия меню --concurrency виртуальных пользователей проходят
+   --flows сценариев: обновление кладется в update_queue, следующий шаг - после
+   обработки предыдущего, как у живого пользователя. Для Excel отчета сценарий
+   заканчивается, когда файл отправлен.
+
+Печатает и сохраняет в JSON (--output) p50/p95/p99 времени сценария, сценарии и
+обновления в секунду и число ошибок в логе для каждого действия; с --compare
+печатает изменение относительно JSON прошлого прогона (например, другого коммита).
+
+    python benchmarks/bench_suite.py --users 10000 --transactions 5000 --home /tmp/bench_home
+    python benchmarks/bench_suite.py --compare bench_suite_1a2b3c4.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stub_openrouter import StubOpenRouter  # noqa: E402
+from stub_telegram import StubTelegram, make_update, percentile  # noqa: E402
+
+# Действие меню -> шаги сценария (тексты сообщений пользователя)
+ACTIONS = {
+    'statistics': ['📊 Статистика'],
+    'detailed_report': ['📋 Детальный отчет'],
+    'excel_report': ['📊 Excel отчет', '📅 Месяц'],
+    'ai_analysis': ['🤖 AI-анализ'],
+    'add_expense': ['💰 Добавить расход', '350', '🍔 Еда', '/skip'],
+}
+
+CATEGORIES = {
+    'income': ['💼 Зарплата', '👨‍💻 Фриланс', '🎁 Подарок', '📈 Инвестиции', '🏆 Премия', '📱 Прочее'],
+    'expense': ['🍔 Еда', '🚗 Транспорт', '🏠 Жилье', '🎬 Развлечения', '🏥 Здоровье', '🎓 Образование',
+                '👕 Одежда', '📱 Прочее'],
+}
+DESCRIPTIONS = ['', 'магазин', 'кафе', 'такси', 'подписка', 'перевод']
+
+# Пользователей в одной транзакции при заполнении базы
+SEED_CHUNK_USERS = 100
+# Сколько ждать обработки одного шага, прежде чем считать сценарий зависшим (секунды)
+STEP_TIMEOUT = 120
+
+
+def seed(db_path: str, users: int, per_user: int, days: int, rng_seed: int):
+    import database
+
+    rng = random.Random(rng_seed)
+    end = datetime.now()
+    span = days * 86400
+
+    conn = sqlite3.connect(db_path)
+    database._migrate(conn)
+    # Заполнение одноразовое: надежность записи не нужна
+    conn.execute('PRAGMA synchronous = OFF')
+    for first in range(1, users + 1, SEED_CHUNK_USERS):
+        rows = []
+        for user_id in range(first, min(first + SEED_CHUNK_USERS, users + 1)):
+            for _ in range(per_user):
+                tr_type = 'income' if rng.random() < 0.15 else 'expense'
+                amount = round(rng.uniform(50000, 150000) if tr_type == 'income' else rng.uniform(50, 8000), 2)
+                date = end - timedelta(seconds=rng.uniform(0, span))
+                rows.append((user_id, amount, tr_type, rng.choice(CATEGORIES[tr_type]),
+                             rng.choice(DESCRIPTIONS), database.format_date(date)))
+        conn.executemany('''
+            INSERT INTO transactions (user_id, amount, type, category, description, date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+        print(f"  seeded {min(first + SEED_CHUNK_USERS - 1, users)}/{users} users", end='\r', flush=True)
+
+    conn.execute('DELETE FROM transaction_summary')
+    conn.execute(database.SUMMARY_REBUILD_SQL)
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+    print()
+
+
+def ensure_seeded(home: str, args):
+    """Заполняет базу, если в home нет базы с теми же параметрами"""
+    marker_path = os.path.join(home, 'bench_seed.json')
+    params = {'users': args.users, 'transactions': args.transactions, 'days': args.days, 'seed': args.seed}
+    db_path = os.path.join(home, 'finance.db')
+    if os.path.exists(db_path) and os.path.exists(marker_path):
+        with open(marker_path) as file:
+            if json.load(file) == params:
+                print(f"using seeded database {db_path}")
+                return
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    print(f"seeding {args.users} users x {args.transactions} transactions...")
+    started = time.perf_counter()
+    seed(db_path, args.users, args.transactions, args.days, args.seed)
+    print(f"seeded in {time.perf_counter() - started:.1f}s")
+    with open(marker_path, 'w') as file:
+        json.dump(params, file)
+
+
+
+
+class ErrorCounter(logging.Handler):
+    """Считает записи лога уровня ERROR: обработчики бота глотают исключения и пишут их в лог"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+class Driver:
+    """Кладет обновления в очередь Application и ждет окончания их обработки"""
+
+    def __init__(self, application):
+        from telegram import Update
+        from telegram.ext import TypeHandler
+
+        self.application = application
+        self._ids = itertools.count(1)
+        self._waiters = {}
+        # Группа 1 выполняется после обработчика бота в том же process_update
+        application.add_handler(TypeHandler(Update, self._processed), group=1)
+
+    async def _processed(self, update, context):
+        future = self._waiters.pop(update.update_id, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    async def send(self, user_id: int, text: str):
+        from telegram import Update
+
+        update_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[update_id] = future
+        update = Update.de_json(make_update(update_id, user_id, text), self.application.bot)
+        await self.application.update_queue.put(update)
+        await asyncio.wait_for(future, STEP_TIMEOUT)
+
+    async def flow(self, user_id: int, steps: list):
+        import reports
+
+        for text in steps:
+            await self.send(user_id, text)
+        # Отчет формируется в очереди отчетов уже после ответа обработчика
+        while reports.queue.is_pending(user_id):
+            await asyncio.sleep(0.002)
+
+
+async def measure_action(driver: Driver, steps: list, user_ids: list, flows: int, concurrency: int,
+                         errors: ErrorCounter) -> dict:
+    latencies = []
+    remaining = itertools.count()
+    errors_before = errors.count
+
+    async def virtual_user(own_users: list):
+        # У каждого виртуального пользователя свои user_id: шаги одного диалога не перемешиваются
+        for user_id in itertools.cycle(own_users):
+            if next(remaining) >= flows:
+                return
+            started = time.perf_counter()
+            await driver.flow(user_id, steps)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(user_ids[i::concurrency]) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'flows': len(latencies),
+        'updates': len(latencies) * len(steps),
+        'seconds': round(elapsed, 3),
+        'flows_per_sec': round(len(latencies) / elapsed, 2),
+        'updates_per_sec': round(len(latencies) * len(steps) / elapsed, 2),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 2),
+            'p95': round(percentile(latencies, 95) * 1000, 2),
+            'p99': round(percentile(latencies, 99) * 1000, 2),
+            'mean': round(sum(latencies) / len(latencies) * 1000, 2),
+            'max': round(latencies[-1] * 1000, 2),
+        },
+        'errors': errors.count - errors_before,
+    }
+
+
+async def run(args) -> dict:
+    import bot
+    import database
+
+    database.init_db()
+    application = bot.build_application(bot.get_builder().updater(None))
+    driver = Driver(application)
+    errors = ErrorCounter()
+    logging.getLogger().addHandler(errors)
+
+    rng = random.Random(args.seed)
+    concurrency = min(args.concurrency, args.users)
+    user_ids = rng.sample(range(1, args.users + 1), min(args.users, max(args.flows, concurrency)))
+
+    results = {}
+    # Порядок запуска и остановки - как в webhook.serve
+    try:
+        async with application:
+            await application.post_init(application)
+            await application.start()
+            try:
+                for name in args.actions:
+                    steps = ACTIONS[name]
+                    if args.warmup:
+                        # Прогрев: процессы отчетов, соединения, кэши страниц SQLite
+                        await measure_action(driver, steps, user_ids, args.warmup, concurrency, errors)
+                    results[name] = await measure_action(driver, steps, user_ids, args.flows, concurrency, errors)
+                    print_result(name, results[name])
+            finally:
+                await application.stop()
+    finally:
+        await application.post_shutdown(application)
+        logging.getLogger().removeHandler(errors)
+    return results
+
+
+def print_result(name: str, result: dict, baseline: dict = None):
+    latency = result['latency_ms']
+    line = (f"{name:16} p50 {latency['p50']:9.1f} ms  p95 {latency['p95']:9.1f} ms  "
+            f"p99 {latency['p99']:9.1f} ms  {result['updates_per_sec']:8.1f} upd/s  errors {result['errors']}")
+    if baseline is not None:
+        base = baseline['latency_ms']
+        line += (f"  | vs baseline: p50 {change(latency['p50'], base['p50'])}, "
+                 f"p95 {change(latency['p95'], base['p95'])}, "
+                 f"upd/s {change(result['updates_per_sec'], baseline['updates_per_sec'])}")
+    print(line)
+
+
+def change(value: float, base: float) -> str:
+    return f"{(value - base) / base * 100:+.1f}%" if base else 'n/a'
+
+
+def git_revision() -> str:
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return revision + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--transactions', type=int, default=500, help='операций на пользователя')
+    parser.add_argument('--days', type=int, default=365, help='за сколько дней распределены операции')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--home', help='каталог с базой (сохраняется между запусками); по умолчанию временный')
+    parser.add_argument('--actions', nargs='+', choices=list(ACTIONS), default=list(ACTIONS))
+    parser.add_argument('--flows', type=int, default=200, help='сценариев на действие')
+    parser.add_argument('--warmup', type=int, default=10, help='сценариев прогрева на действие (не учитываются)')
+    parser.add_argument('--concurrency', type=int, default=8, help='одновременных виртуальных пользователей')
+    parser.add_argument('--workers', type=int, default=8, help='CONCURRENT_UPDATES бота')
+    parser.add_argument('--telegram-delay', type=float, default=0.0, help='задержка ответа Bot API (сек)')
+    parser.add_argument('--ai-delay', type=float, default=0.2, help='время генерации ответа AI (сек)')
+    parser.add_argument('--output', help='JSON с результатами; по умолчанию bench_suite_<коммит>.json')
+    parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+    args = parser.parse_args()
+
+    revision = git_revision()
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    with tempfile.TemporaryDirectory() as tmp_home, StubTelegram(delay=args.telegram_delay) as telegram, \
+            StubOpenRouter(delay=args.ai_delay) as openrouter:
+        home = os.path.abspath(args.home) if args.home else tmp_home
+        os.makedirs(home, exist_ok=True)
+        # До импорта модулей бота: config и database читают окружение при импорте
+        os.environ.update({
+            'HOME': home, 'TOKEN': '123:BENCH', 'TELEGRAM_API_URL': telegram.base_url,
+            'TELEGRAM_FILE_URL': telegram.base_file_url,
+            'OPENROUTER_API_URL': openrouter.url, 'OPENROUTER_API_KEY': 'bench', 'OPENROUTER_MODEL': 'bench/model',
+            'CONCURRENT_UPDATES': str(args.workers), 'REPORT_PRELOAD_DELAY': '-1',
+        })
+        ensure_seeded(home, args)
+        results = asyncio.run(run(args))
+        # Для проверки, что сценарии дошли до заглушек (файлы отчетов, запросы к AI)
+        backend_calls = {'telegram': dict(telegram.calls), 'openrouter': openrouter.requests}
+
+    report = {
+        'revision': revision,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'home')},
+        'actions': results,
+        'backend_calls': backend_calls,
+    }
+    output = args.output or f'bench_suite_{revision}.json'
+    with open(output, 'w') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"results saved to {output}")
+
+    if baseline is not None:
+        print(f"compared with {baseline.get('revision')} ({args.compare}):")
+        for name, result in results.items():
+            if name in baseline['actions']:
+                print_result(name, result, baseline['actions'][name])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Проверка параллельной обработки обновлений с сохранением порядка по пользователям.
+
+M пользователей одновременно проходят диалог добавления дохода
+(кнопка -> сумма -> категория -> /skip) через настоящие обработчики бота;
+ответы уходят в заглушку Bot API с задержкой D. Скрипт сравнивает время
+последовательной обработки и UserOrderedUpdateProcessor и проверяет, что
+у каждого пользователя сохранилась ровно одна операция (шаги диалога не
+перепутались).
+
+    python benchmarks/bench_update_ordering.py --users 50 --delay 0.05 --workers 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_telegram import StubTelegram, make_update  # noqa: E402
+
+STEPS = ['💵 Добавить доход', '1000', '💼 Зарплата', '/skip']
+
+
+
+async def run(users: int, workers: int, stub: StubTelegram, user_offset: int) -> float:
+    from telegram import Update
+    from telegram.ext import Application, TypeHandler
+
+    import bot
+    import database
+    from update_processor import UserOrderedUpdateProcessor
+
+    database.init_db()
+    processor = UserOrderedUpdateProcessor(workers, 1000) if workers > 1 else 1
+    builder = Application.builder().token('123:BENCH').base_url(stub.base_url).concurrent_updates(processor)
+    application = bot.build_application(builder.updater(None))
+
+    total = users * len(STEPS)
+    processed = 0
+    done = asyncio.Event()
+
+    async def count(update, context):
+        nonlocal processed
+        processed += 1
+        if processed == total:
+            done.set()
+
+    application.add_handler(TypeHandler(Update, count), group=1)
+
+    user_ids = [user_offset + i for i in range(users)]
+    async with application:
+        await application.start()
+        started = time.perf_counter()
+        # Шаги разных пользователей перемешаны, как в реальном потоке обновлений
+        update_id = 0
+        for step in STEPS:
+            for user_id in user_ids:
+                update_id += 1
+                await application.update_queue.put(Update.de_json(make_update(update_id, user_id, step), application.bot))
+        await asyncio.wait_for(done.wait(), timeout=600)
+        elapsed = time.perf_counter() - started
+        if workers > 1:
+            print(f"  processor stats: {processor.stats()}")
+        await application.stop()
+
+    broken = 0
+    for user_id in user_ids:
+        snapshot = await database.get_financial_snapshot(user_id)
+        if snapshot.transactions_count != 1 or snapshot.income != 1000:
+            broken += 1
+    if broken:
+        print(f"  ERROR: {broken} users have wrong data")
+        sys.exit(1)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--delay', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home, StubTelegram(delay=args.delay) as stub:
+        os.environ['HOME'] = home
+
+        sequential = asyncio.run(run(args.users, 1, stub, 1000))
+        print(f"sequential:        {sequential:.2f}s")
+        concurrent = asyncio.run(run(args.users, args.workers, stub, 2000))
+        print(f"per-user ordered:  {concurrent:.2f}s ({args.workers} workers)")
+        print(f"speedup: x{sequential / concurrent:.1f}, all conversations consistent: OK")
+
+
+if __name__ == '__main__':
+    main()
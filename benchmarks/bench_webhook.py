@@ -0,0 +1,124 @@
+"""Нагрузочный тест режима webhook.
+
+Поднимает ASGI-сервер из webhook.py с настоящими обработчиками бота (ответы
+уходят в заглушку Bot API), отправляет N синтетических обновлений от M
+пользователей с C параллельными соединениями и печатает пропускную способность
+приема (HTTP 200) и полной обработки, а также задержки ответа webhook.
+
+    python benchmarks/bench_webhook.py --updates 2000 --users 100 --connections 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_telegram import StubTelegram, free_port, make_update, percentile  # noqa: E402
+
+SECRET = 'bench-secret'
+TEXTS = ['📊 Статистика', '📋 Детальный отчет', '❓ Помощь', '/start']
+
+
+
+
+
+async def run(args, stub: StubTelegram):
+    import httpx
+    import uvicorn
+    from telegram import Update
+    from telegram.ext import Application, TypeHandler
+
+    import bot
+    import database
+    import webhook
+    from update_processor import UserOrderedUpdateProcessor
+
+    database.init_db()
+    processor = (UserOrderedUpdateProcessor(args.concurrent_updates, 1000)
+                 if args.concurrent_updates > 1 else 1)
+    builder = (Application.builder().token('123:BENCH').base_url(stub.base_url)
+               .concurrent_updates(processor).updater(None))
+    application = bot.build_application(builder)
+
+    processed = 0
+    done = asyncio.Event()
+
+    async def count(update, context):
+        nonlocal processed
+        processed += 1
+        if processed == args.updates:
+            done.set()
+
+    # Отдельная группа: срабатывает после основных обработчиков каждого обновления
+    application.add_handler(TypeHandler(Update, count), group=1)
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        webhook.create_app(application, SECRET), host='127.0.0.1', port=port,
+        log_level='warning', access_log=False
+    ))
+
+    async with application:
+        await application.start()
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        url = f'http://127.0.0.1:{port}'
+        limits = httpx.Limits(max_connections=args.connections)
+        async with httpx.AsyncClient(base_url=url, limits=limits) as client:
+            assert (await client.get('/readyz')).status_code == 200
+            rejected = await client.post('/telegram', json=make_update(0, 1, '/start'),
+                                         headers={webhook.SECRET_HEADER: 'wrong'})
+            assert rejected.status_code == 403, rejected.status_code
+
+            latencies = []
+            semaphore = asyncio.Semaphore(args.connections)
+
+            async def post(i):
+                update = make_update(i, 1000 + i % args.users, TEXTS[i % len(TEXTS)])
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post('/telegram', json=update,
+                                                 headers={webhook.SECRET_HEADER: SECRET})
+                    latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(post(i) for i in range(1, args.updates + 1)))
+            ingested = time.perf_counter() - started
+            await asyncio.wait_for(done.wait(), timeout=300)
+            completed = time.perf_counter() - started
+
+        server.should_exit = True
+        await serving
+        await application.stop()
+
+    print(f"updates: {args.updates}, users: {args.users}, connections: {args.connections}, "
+          f"concurrent_updates: {args.concurrent_updates}")
+    print(f"ingest:    {args.updates / ingested:8.0f} updates/s ({ingested:.2f}s)")
+    print(f"processed: {args.updates / completed:8.0f} updates/s ({completed:.2f}s)")
+    print(f"webhook latency p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+          f"p95 {percentile(latencies, 95) * 1000:.1f} ms, p99 {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"Bot API calls: {dict(stub.calls)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--concurrent-updates', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home, StubTelegram() as stub:
+        # База бота создается во временном домашнем каталоге
+        os.environ['HOME'] = home
+        asyncio.run(run(args, stub))
+
+
+if __name__ == '__main__':
+    main()
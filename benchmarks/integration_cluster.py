@@ -0,0 +1,167 @@
+"""Интеграционная проверка режима cluster (несколько процессов-воркеров).
+
+Запускает `python bot.py` с BOT_MODE=cluster и заглушкой Bot API, затем:
+1. M пользователей параллельно проходят диалог добавления дохода - у каждого
+   должна оказаться ровно одна операция, а обновления - распределиться по всем воркерам;
+2. часть пользователей останавливается посреди диалога или на выборе периода отчета;
+3. кластер перезапускается, и эти пользователи продолжают с того же места:
+   состояние диалога и флаги user_data восстановлены из общей базы.
+
+    python benchmarks/integration_cluster.py --workers 3 --users 60
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stub_telegram import StubTelegram, free_port, make_update  # noqa: E402
+
+SECRET = 'cluster-secret'
+
+
+
+
+class ClusterProcess:
+    def __init__(self, env: dict, port: int):
+        self.env = env
+        self.url = f'http://127.0.0.1:{port}'
+        self.process = None
+        self.update_id = 0
+
+    async def start(self, client):
+        # Логи процессов кластера - в HOME/cluster.log
+        log = open(os.path.join(self.env['HOME'], 'cluster.log'), 'ab')
+        self.process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'bot.py')], env=self.env,
+                                        stdout=log, stderr=subprocess.STDOUT)
+        log.close()
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f'{self.url}/readyz')).status_code == 200:
+                    return
+            except Exception:
+                pass
+            await asyncio.sleep(0.2)
+        raise RuntimeError('cluster did not become ready')
+
+    def stop(self):
+        self.process.send_signal(signal.SIGTERM)
+        self.process.wait(timeout=60)
+
+    async def send(self, client, user_id: int, text: str):
+        self.update_id += 1
+        response = await client.post(f'{self.url}/telegram', json=make_update(self.update_id, user_id, text),
+                                     headers={'X-Telegram-Bot-Api-Secret-Token': SECRET})
+        response.raise_for_status()
+
+    async def conversation(self, client, user_id: int, steps):
+        for text in steps:
+            await self.send(client, user_id, text)
+
+
+async def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(0.1)
+
+
+def check(condition: bool, message: str):
+    print(f"{'OK  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        sys.exit(1)
+
+
+async def run(args, stub: StubTelegram, home: str):
+    import httpx
+
+    port = free_port()
+    env = dict(os.environ, HOME=home, BOT_MODE='cluster', CLUSTER_WORKERS=str(args.workers),
+               TOKEN='123:CLUSTER', TELEGRAM_API_URL=stub.base_url, PORT=str(port),
+               WEBHOOK_HOST='127.0.0.1', WEBHOOK_URL=f'http://127.0.0.1:{port}', WEBHOOK_SECRET=SECRET)
+    cluster = ClusterProcess(env, port)
+    users = list(range(5000, 5000 + args.users))
+    db_path = os.path.join(home, 'finance.db')
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        # ===== 1. Полные диалоги всех пользователей параллельно =====
+        await cluster.start(client)
+        sent = stub.calls['sendMessage']
+        await asyncio.gather(*(
+            cluster.conversation(client, user_id, ['💵 Добавить доход', '1000', '💼 Зарплата', '/skip'])
+            for user_id in users
+        ))
+        await wait_for(lambda: stub.calls['sendMessage'] - sent >= len(users) * 4)
+
+        status = (await client.get(f'{cluster.url}/readyz')).json()
+        routed = [worker['routed'] for worker in status['workers']]
+        check(all(routed), f"updates routed to every worker: {routed}")
+
+        with sqlite3.connect(db_path) as conn:
+            counts = dict(conn.execute(
+                'SELECT user_id, COUNT(*) FROM transactions WHERE user_id >= 5000 GROUP BY user_id'
+            ).fetchall())
+        check(all(counts.get(user_id) == 1 for user_id in users),
+              f"each of {len(users)} users has exactly one transaction")
+
+        # ===== 2. Останавливаемся посреди диалогов =====
+        half = users[:len(users) // 2]
+        waiting_report = users[len(users) // 2:]
+        sent = stub.calls['sendMessage']
+        await asyncio.gather(*(cluster.conversation(client, user_id, ['💰 Добавить расход', '250']) for user_id in half))
+        await asyncio.gather(*(cluster.send(client, user_id, '📊 Excel отчет') for user_id in waiting_report))
+        await wait_for(lambda: stub.calls['sendMessage'] - sent >= len(half) * 2 + len(waiting_report))
+        cluster.stop()
+
+        with sqlite3.connect(db_path) as conn:
+            saved = conn.execute('SELECT COUNT(*) FROM bot_user_data WHERE user_id >= 5000').fetchone()[0]
+            conversations = conn.execute('SELECT COUNT(*) FROM bot_conversations').fetchone()[0]
+        check(saved >= len(users), f"user_data persisted on shutdown ({saved} users)")
+        check(conversations == len(half), f"{conversations} open conversations persisted")
+
+        # ===== 3. После перезапуска пользователи продолжают с того же шага =====
+        await cluster.start(client)
+        documents = stub.calls['sendDocument']
+        await asyncio.gather(*(cluster.conversation(client, user_id, ['🍔 Еда', '/skip']) for user_id in half))
+        await asyncio.gather(*(cluster.send(client, user_id, '📅 Месяц') for user_id in waiting_report))
+        await wait_for(lambda: stub.calls['sendDocument'] - documents >= len(waiting_report), timeout=120)
+        cluster.stop()
+
+        with sqlite3.connect(db_path) as conn:
+            expenses = dict(conn.execute('''
+                SELECT user_id, SUM(amount) FROM transactions
+                WHERE user_id >= 5000 AND type = 'expense' GROUP BY user_id
+            ''').fetchall())
+        check(all(expenses.get(user_id) == 250 for user_id in half),
+              f"{len(half)} conversations resumed after restart")
+        check(stub.calls['sendDocument'] - documents == len(waiting_report),
+              f"{len(waiting_report)} report prompts resumed after restart")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--users', type=int, default=60)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home, StubTelegram() as stub:
+        try:
+            asyncio.run(run(args, stub, home))
+        except SystemExit:
+            with open(os.path.join(home, 'cluster.log'), errors='replace') as log:
+                print('--- cluster.log (tail) ---')
+                print(''.join(log.readlines()[-30:]))
+            raise
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Локальная заглушка OpenRouter для бенчмарков.
+
+Отвечает на POST /api/v1/chat/completions в формате OpenAI с заданной задержкой.
+При "stream": true отдает ответ по словам в виде SSE.
+Для проверки устойчивости умеет внедрять ошибки: постоянные коды ответа для
+отдельных моделей (failures), случайные ошибки (fail_rate) и Retry-After.
+Запуск отдельно: python benchmarks/stub_openrouter.py --port 8765 --delay 0.5
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive, чтобы клиент мог переиспользовать соединения
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        model = payload.get('model')
+        self.server.requests += 1
+        self.server.model_requests[model] += 1
+
+        status = self.server.failures.get(model)
+        if status is None and random.random() < self.server.fail_rate:
+            status = self.server.fail_status
+        if status is not None:
+            self._fail(status)
+            return
+
+        if payload.get('stream'):
+            self._stream(payload)
+            return
+
+        time.sleep(self.server.delay)
+
+        body = json.dumps({
+            'id': 'stub',
+            'model': payload.get('model'),
+            'choices': [{'message': {'role': 'assistant', 'content': self.server.answer}}],
+            'usage': {'prompt_tokens': 100, 'completion_tokens': 50, 'total_tokens': 150},
+        }).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fail(self, status: int):
+        body = json.dumps({'error': {'code': status, 'message': 'injected fault'}}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.server.retry_after is not None:
+            self.send_header('Retry-After', str(self.server.retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _stream(self, payload):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        self._write_chunk(b': OPENROUTER PROCESSING\n\n')
+        words = self.server.answer.split(' ')
+        for i, word in enumerate(words):
+            time.sleep(self.server.delay / len(words))
+            delta = {'choices': [{'delta': {'content': word if i == 0 else ' ' + word}}]}
+            self._write_chunk(f'data: {json.dumps(delta)}\n\n'.encode())
+        self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+
+class StubOpenRouter:
+    """HTTP-сервер заглушки в фоновом потоке"""
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0.5, answer='Тестовый ответ AI.',
+                 failures=None, fail_rate=0.0, fail_status=503, retry_after=None):
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.delay = delay
+        self._server.answer = answer
+        self._server.requests = 0
+        self._server.model_requests = Counter()
+        # Внедрение ошибок: {модель: код ответа}, доля случайных ошибок, заголовок Retry-After
+        self._server.failures = dict(failures or {})
+        self._server.fail_rate = fail_rate
+        self._server.fail_status = fail_status
+        self._server.retry_after = retry_after
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/api/v1/chat/completions'
+
+    @property
+    def requests(self) -> int:
+        return self._server.requests
+
+    @property
+    def model_requests(self) -> Counter:
+        return self._server.model_requests
+
+    def set_failure(self, model: str, status: int = None):
+        """Включает (status) или выключает (None) постоянную ошибку для модели"""
+        if status is None:
+            self._server.failures.pop(model, None)
+        else:
+            self._server.failures[model] = status
+
+    def set_retry_after(self, seconds):
+        self._server.retry_after = seconds
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.5)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--fail-status', type=int, default=503)
+    args = parser.parse_args()
+
+    stub = StubOpenRouter(port=args.port, delay=args.delay,
+                          fail_rate=args.fail_rate, fail_status=args.fail_status)
+    print(f'Заглушка OpenRouter: {stub.url}')
+    stub._server.serve_forever()
@@ -0,0 +1,202 @@
+"""Локальная заглушка Telegram Bot API для бенчмарков.
+
+Отвечает на POST /bot<token>/<method> корректными для python-telegram-bot
+объектами: getMe - бот, send*/edit* - сообщение, getFile - файл из
+StubTelegram.files (его содержимое отдается по GET /file/bot<token>/<file_id>),
+getUpdates - обновления из StubTelegram.updates (для режима polling),
+остальное - true.
+Считает вызовы по методам; задержка ответа задается параметром delay.
+Здесь же общие для бенчмарков помощники: make_update(), free_port(), percentile().
+Запуск отдельно: python benchmarks/stub_telegram.py --port 8766
+"""
+import argparse
+import json
+import math
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub_bot'}
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    """Обновление с текстовым сообщением пользователя в формате Bot API"""
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'},
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+    return {'update_id': update_id, 'message': message}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: list, q: float) -> float:
+    """Перцентиль q (0-100) по ближайшему рангу"""
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят отдельными записями: без этого Nagle + delayed ACK дают ~40 мс на ответ
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        method = self.path.rsplit('/', 1)[-1]
+        params = self._params(body)
+
+        with self.server.lock:
+            self.server.calls[method] += 1
+            self.server.message_id += 1
+            message_id = self.server.message_id
+
+        if self.server.delay:
+            time.sleep(self.server.delay)
+
+        if method == 'getMe':
+            result = BOT_USER
+        elif method == 'getUpdates':
+            offset = int(params.get('offset') or 0)
+            result = [update for update in self.server.updates if update['update_id'] >= offset]
+            if not result:
+                # Вместо long polling - короткая пауза, чтобы клиент не крутился вхолостую
+                time.sleep(0.05)
+        elif method == 'getFile':
+            file_id = params.get('file_id')
+            result = {'file_id': file_id, 'file_unique_id': f'u{file_id}',
+                      'file_size': len(self.server.files[file_id]), 'file_path': file_id}
+        elif method.startswith(('send', 'edit')) and method != 'sendChatAction':
+            result = self._message(message_id, method, params)
+        else:
+            result = True
+
+        payload = json.dumps({'ok': True, 'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент закрыл соединение, не дождавшись ответа (остановка бота во время getUpdates)
+            pass
+
+    def do_GET(self):
+        content = self.server.files.get(self.path.rsplit('/', 1)[-1])
+        if content is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _params(self, body: bytes) -> dict:
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('application/json'):
+            return json.loads(body or b'{}')
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            return {k: v[0] for k, v in parse_qs(body.decode()).items()}
+        # multipart (загрузка файлов) не разбираем
+        return {}
+
+    def _message(self, message_id: int, method: str, params: dict) -> dict:
+        try:
+            chat_id = int(params.get('chat_id', 1))
+        except ValueError:
+            chat_id = 1
+
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+        }
+        if 'text' in params:
+            message['text'] = params['text']
+        if method == 'sendDocument':
+            message['document'] = {'file_id': f'file{message_id}', 'file_unique_id': f'u{message_id}'}
+        return message
+
+
+class StubTelegram:
+    """HTTP-сервер заглушки в фоновом потоке"""
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0):
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.delay = delay
+        self._server.calls = Counter()
+        self._server.message_id = 0
+        self._server.files = {}
+        self._server.updates = []
+        self._server.lock = threading.Lock()
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        """Значение для ApplicationBuilder.base_url()"""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/bot'
+
+    @property
+    def base_file_url(self) -> str:
+        """Значение для ApplicationBuilder.base_file_url()"""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/file/bot'
+
+    @property
+    def calls(self) -> Counter:
+        return self._server.calls
+
+    @property
+    def updates(self) -> list:
+        """Обновления, которые отдает getUpdates (словари в формате Bot API)"""
+        return self._server.updates
+
+    @property
+    def files(self) -> dict:
+        """file_id -> содержимое файла, который бот может скачать через getFile"""
+        return self._server.files
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--delay', type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub = StubTelegram(port=args.port, delay=args.delay)
+    print(f'Заглушка Telegram Bot API: {stub.base_url}')
+    stub._server.serve_forever()
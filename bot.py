@@ -1,89 +1,120 @@
 import logging
 logging.basicConfig(level=logging.INFO)
-import sqlite3
 import os
-import requests
+import tempfile
 from datetime import datetime, timedelta
-import pandas as pd
-from config import TOKEN, OPENROUTER_API_KEY, OPENROUTER_API_URL, OPENROUTER_MODEL
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
-from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, ConversationHandler, filters
-
-async def get_ai_response(prompt: str) -> str:
-    """Получение ответа от AI через OpenRouter"""
-    try:
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://your-site.com",
-            "X-Title": "Financial Bot"
-        }
+from typing import Optional
+import ai_cache
+import ai_client
+import ai_limiter
+import database
+import importer
+import metrics
+import profiling
+import report_cache
+import reports
+import tracing
+from config import (
+    TOKEN, OPENROUTER_MODEL, AI_STREAMING, AI_STREAM_EDIT_INTERVAL,
+    BOT_MODE, WEBHOOK_PORT, CONCURRENT_UPDATES, UPDATE_MAX_PENDING, CLUSTER_WORKERS, TELEGRAM_API_URL,
+    TELEGRAM_FILE_URL, TRACE_UPDATES, ADMIN_IDS,
+)
+from persistence import SQLitePersistence
+from streaming import StreamingMessage
+from update_processor import UserOrderedUpdateProcessor
+from telegram import Update, ReplyKeyboardMarkup
+from telegram.error import BadRequest
+from telegram.ext import Application, ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, ConversationHandler, filters
+from telegram.request import HTTPXRequest
+
+def get_ai_cache_key(user_id: int, prompt: str, snapshot: database.FinancialSnapshot) -> str:
+    return ai_cache.make_key(user_id, OPENROUTER_MODEL, prompt, snapshot.fingerprint)
+
+def queue_notifier(update: Update):
+    """Сообщает пользователю его место в очереди AI-запросов"""
+    async def on_queued(position: int):
+        await update.message.reply_text(f"⏳ Сейчас много запросов к AI. Ваше место в очереди: {position}")
+    return on_queued
+
+AI_BUSY_TEXT = "🚦 Сейчас слишком много запросов к AI. Попробуйте через минуту."
+
+@metrics.timed('ai_response')
+async def get_ai_response(prompt: str, user_id: int = None, snapshot: database.FinancialSnapshot = None,
+                          on_queued=None) -> str:
+    """Получение ответа от AI через OpenRouter (с кэшем, если известны пользователь и его данные).
+
+    Если AI недоступен, выбрасывает исключение (ai_limiter.AIQueueFull при переполненной очереди).
+    """
+    cache_key = get_ai_cache_key(user_id, prompt, snapshot) if snapshot is not None else None
+    if cache_key:
+        cached = await ai_cache.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    # Повторные запросы пользователя не идут параллельно: его обновления обрабатываются
+    # по очереди (UserOrderedUpdateProcessor), и следующий получит ответ из кэша
+    async with ai_limiter.gate.slot(on_queued):
+        answer = await ai_client.complete(prompt)
+
+    if cache_key:
+        await ai_cache.cache.set(cache_key, user_id, answer)
+    return answer
+
+def clean_markdown(text):
+    """Очищаем текст от неправильного Markdown форматирования"""
+    # Убираем незакрытые Markdown символы
+    text = text.replace('*', '').replace('_', '').replace('`', '').replace('~', '')
+    # Убираем другие потенциально проблемные символы
+    text = text.replace('[', '').replace(']', '').replace('(', '').replace(')', '')
+    return text
+
+@metrics.timed('ai_stream')
+async def stream_ai_analysis(update: Update, prompt: str, snapshot: database.FinancialSnapshot):
+    """AI-анализ с потоковым выводом: одно сообщение дописывается по мере генерации"""
+    user_id = update.effective_user.id
+    cache_key = get_ai_cache_key(user_id, prompt, snapshot)
 
-        payload = {
-            "model": OPENROUTER_MODEL,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7,
-            "max_tokens": 500
-        }
+    reply = StreamingMessage(
+        update.message,
+        header="📊 ДЕТАЛЬНЫЙ AI-АНАЛИЗ ВАШИХ ФИНАНСОВ:\n\n",
+        min_interval=AI_STREAM_EDIT_INTERVAL
+    )
+    await reply.start("🤖 Глубоко анализирую ваши финансы...")
 
-        response = requests.post(OPENROUTER_API_URL, headers=headers, json=payload, timeout=15)
-        response.raise_for_status()
+    cached = await ai_cache.cache.get(cache_key)
+    if cached is not None:
+        await reply.append(cached)
+        await reply.finish()
+        return
 
-        return response.json()["choices"][0]["message"]["content"]
+    try:
+        async with ai_limiter.gate.slot(queue_notifier(update)):
+            chunks = []
+            async for chunk in ai_client.stream(prompt):
+                chunk = clean_markdown(chunk)
+                chunks.append(chunk)
+                await reply.append(chunk)
+            await reply.finish()
+        await ai_cache.cache.set(cache_key, user_id, ''.join(chunks))
+
+    # Ошибка выводится в том же сообщении, чтобы заглушка "анализирую..." не осталась висеть
+    except ai_limiter.AIQueueFull:
+        await reply.fail(AI_BUSY_TEXT)
 
     except Exception as e:
-        return f"❌ Ошибка AI: {str(e)}"
+        logging.error(f"AI analysis stream error: {str(e)}")
+        await reply.fail("❌ Произошла ошибка при анализе. Попробуйте позже.")
 
 async def ai_financial_analysis(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Улучшенный AI-анализ финансов с персонализацией"""
     user_id = update.effective_user.id
 
-    db_path = os.path.join(os.path.expanduser("~"), 'finance.db')
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
     # Получаем больше данных для анализа
-    cursor.execute('SELECT SUM(amount) FROM transactions WHERE user_id = ? AND type = "income"', (user_id,))
-    income = cursor.fetchone()[0] or 0
-
-    cursor.execute('SELECT SUM(amount) FROM transactions WHERE user_id = ? AND type = "expense"', (user_id,))
-    expense = cursor.fetchone()[0] or 0
-
-    # Статистика за последний месяц (исправленный подход)
-    current_month = datetime.now().strftime('%Y-%m')
-    cursor.execute('''
-        SELECT SUM(amount) FROM transactions
-        WHERE user_id = ? AND type = "income" AND strftime('%Y-%m', date) = ?
-    ''', (user_id, current_month))
-    income_month = cursor.fetchone()[0] or 0
-
-    cursor.execute('''
-        SELECT SUM(amount) FROM transactions
-        WHERE user_id = ? AND type = "expense" AND strftime('%Y-%m', date) = ?
-    ''', (user_id, current_month))
-    expense_month = cursor.fetchone()[0] or 0
-
-    # Детальная статистика по категориям
-    cursor.execute('''
-        SELECT category, SUM(amount), COUNT(*)
-        FROM transactions
-        WHERE user_id = ? AND type = 'expense'
-        GROUP BY category
-        ORDER BY SUM(amount) DESC
-    ''', (user_id,))
-    categories = cursor.fetchall()
-
-    # Самые крупные recent траты
-    cursor.execute('''
-        SELECT category, amount, description, date
-        FROM transactions
-        WHERE user_id = ? AND type = 'expense'
-        ORDER BY amount DESC
-        LIMIT 3
-    ''', (user_id,))
-    largest_expenses = cursor.fetchall()
-
-    conn.close()
+    snapshot = await database.get_financial_snapshot(user_id)
+    income, expense = snapshot.income, snapshot.expense
+    income_month, expense_month = snapshot.income_month, snapshot.expense_month
+    categories = snapshot.expense_categories
+    largest_expenses = snapshot.largest_expenses
 
     # Создаем более детальный и персонализированный промпт
     prompt = f"""
@@ -123,18 +154,14 @@ async def ai_financial_analysis(update: Update, context: ContextTypes.DEFAULT_TY
     Избегай общих фраз вроде "ведите бюджет" или "откладывайте 10%". Будь максимально конкретным и практичным. Ответ на русском.
     """
 
+    if AI_STREAMING:
+        await stream_ai_analysis(update, prompt, snapshot)
+        return
+
     await update.message.reply_text("🤖 Глубоко анализирую ваши финансы... Это займет 15-20 секунд")
 
     try:
-        analysis = await get_ai_response(prompt)
-
-        # Очищаем текст от неправильного Markdown форматирования
-        def clean_markdown(text):
-            # Убираем незакрытые Markdown символы
-            text = text.replace('*', '').replace('_', '').replace('`', '').replace('~', '')
-            # Убираем другие потенциально проблемные символы
-            text = text.replace('[', '').replace(']', '').replace('(', '').replace(')', '')
-            return text
+        analysis = await get_ai_response(prompt, user_id, snapshot, queue_notifier(update))
 
         # Очищаем анализ от проблемного форматирования
         clean_analysis = clean_markdown(analysis)
@@ -166,6 +193,9 @@ async def ai_financial_analysis(update: Update, context: ContextTypes.DEFAULT_TY
                 f"📊 ДЕТАЛЬНЫЙ AI-АНАЛИЗ ВАШИХ ФИНАНСОВ:\n\n{clean_analysis}"
             )
 
+    except ai_limiter.AIQueueFull:
+        await update.message.reply_text(AI_BUSY_TEXT)
+
     except Exception as e:
         logging.error(f"AI analysis error: {str(e)}")
         await update.message.reply_text("❌ Произошла ошибка при анализе. Попробуйте позже.")
@@ -174,29 +204,11 @@ async def ai_financial_tip(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Улучшенные персонализированные финансовые советы"""
     user_id = update.effective_user.id
 
-    db_path = os.path.join(os.path.expanduser("~"), 'finance.db')
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
     # Получаем данные пользователя для персонализации
-    cursor.execute('SELECT SUM(amount) FROM transactions WHERE user_id = ? AND type = "expense"', (user_id,))
-    total_expense = cursor.fetchone()[0] or 0
-
-    cursor.execute('''
-        SELECT category, SUM(amount)
-        FROM transactions
-        WHERE user_id = ? AND type = 'expense'
-        GROUP BY category
-        ORDER BY SUM(amount) DESC
-        LIMIT 1
-    ''', (user_id,))
-    top_category = cursor.fetchone()
-
-    # Количество операций
-    cursor.execute('SELECT COUNT(*) FROM transactions WHERE user_id = ?', (user_id,))
-    total_transactions = cursor.fetchone()[0] or 0
-
-    conn.close()
+    snapshot = await database.get_financial_snapshot(user_id)
+    total_expense = snapshot.expense
+    top_category = snapshot.top_category
+    total_transactions = snapshot.transactions_count
 
     # Создаем персонализированный промпт
     prompt = f"""
@@ -204,7 +216,7 @@ async def ai_financial_tip(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     КОНТЕКСТ ПОЛЬЗОВАТЕЛЯ:
     - Общие расходы: {total_expense:,.2f} руб
-    - Самая затратная категория: {top_category[0] if top_category else 'не определена'} ({top_category[1]:,.2f} руб if top_category else 0)
+    - Самая затратная категория: {top_category[0] if top_category else 'не определена'} ({top_category[1] if top_category else 0:,.2f} руб)
     - Всего операций: {total_transactions}
 
     ТРЕБОВАНИЯ К СОВЕТУ:
@@ -226,11 +238,13 @@ async def ai_financial_tip(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("💡 Генерирую персональный совет для вас...")
 
     try:
-        tip = await get_ai_response(prompt)
+        tip = await get_ai_response(prompt, user_id, snapshot, queue_notifier(update))
         await update.message.reply_text(
             f"💡 *ПЕРСОНАЛЬНЫЙ ФИНАНСОВЫЙ СОВЕТ:*\n\n{tip}",
             parse_mode='Markdown'
         )
+    except ai_limiter.AIQueueFull:
+        await update.message.reply_text(AI_BUSY_TEXT)
     except Exception as e:
         # Fallback совет если AI не ответит
         fallback_tips = [
@@ -244,26 +258,6 @@ async def ai_financial_tip(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(random.choice(fallback_tips))
 
 
-def init_db():
-    db_path = os.path.join(os.path.expanduser("~"), 'finance.db')
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            amount REAL NOT NULL,
-            type TEXT NOT NULL,
-            category TEXT NOT NULL,
-            description TEXT,
-            date TIMESTAMP NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-init_db()
-
 def get_main_keyboard():
     return ReplyKeyboardMarkup([
         ['💵 Добавить доход', '💰 Добавить расход'],
@@ -397,19 +391,12 @@ async def skip_description(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 async def save_transaction(update: Update, context: ContextTypes.DEFAULT_TYPE, description: str):
-    db_path = os.path.join(os.path.expanduser("~"), 'finance.db')
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        INSERT INTO transactions (user_id, amount, type, category, description, date)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (update.effective_user.id, context.user_data['amount'],
-          context.user_data['type'], context.user_data['category'],
-          description, datetime.now()))
-
-    conn.commit()
-    conn.close()
+    await database.add_transaction(
+        update.effective_user.id, context.user_data['amount'],
+        context.user_data['type'], context.user_data['category'], description
+    )
+    await ai_cache.cache.invalidate_user(update.effective_user.id)
+    await report_cache.cache.invalidate_user(update.effective_user.id)
 
     transaction_type = "доход" if context.user_data['type'] == 'income' else "расход"
     emoji = "💵" if context.user_data['type'] == 'income' else "💰"
@@ -422,55 +409,25 @@ async def save_transaction(update: Update, context: ContextTypes.DEFAULT_TYPE, d
     )
 
 async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    db_path = os.path.join(os.path.expanduser("~"), 'finance.db')
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    cursor.execute('SELECT SUM(amount) FROM transactions WHERE user_id = ? AND type = "income"', (update.effective_user.id,))
-    income = cursor.fetchone()[0] or 0
-
-    cursor.execute('SELECT SUM(amount) FROM transactions WHERE user_id = ? AND type = "expense"', (update.effective_user.id,))
-    expense = cursor.fetchone()[0] or 0
-
-    cursor.execute('''
-        SELECT category, SUM(amount)
-        FROM transactions
-        WHERE user_id = ? AND type = 'expense'
-        GROUP BY category
-        ORDER BY SUM(amount) DESC
-    ''', (update.effective_user.id,))
-    expense_by_category = cursor.fetchall()
-
-    conn.close()
+    # Крупные траты в статистике не показываются
+    snapshot = await database.get_financial_snapshot(update.effective_user.id, with_largest=False)
+    income, expense = snapshot.income, snapshot.expense
 
     report = "📊 *ОБЩАЯ СТАТИСТИКА*\n\n"
     report += f"💵 *Доходы:* {income:,.2f} руб.\n"
     report += f"💰 *Расходы:* {expense:,.2f} руб.\n"
     report += f"⚖️ *Баланс:* {income - expense:,.2f} руб.\n\n"
 
-    if expense_by_category:
+    if snapshot.expense_categories:
         report += "📈 *РАСХОДЫ ПО КАТЕГОРИЯМ:*\n"
-        for category, amount in expense_by_category:
+        for category, amount, _ in snapshot.expense_categories:
             percentage = (amount / expense * 100) if expense > 0 else 0
             report += f"• {category}: {amount:,.2f} руб. ({percentage:.1f}%)\n"
 
     await update.message.reply_text(report, parse_mode='Markdown')
 
 async def detailed_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    db_path = os.path.join(os.path.expanduser("~"), 'finance.db')
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        SELECT type, amount, category, description, date
-        FROM transactions
-        WHERE user_id = ?
-        ORDER BY id DESC
-        LIMIT 10
-    ''', (update.effective_user.id,))
-    recent_transactions = cursor.fetchall()
-
-    conn.close()
+    recent_transactions = await database.get_recent_transactions(update.effective_user.id, 10)
 
     if not recent_transactions:
         await update.message.reply_text("📭 У вас пока нет операций")
@@ -481,7 +438,7 @@ async def detailed_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
     for i, (tr_type, amount, category, description, date) in enumerate(recent_transactions, 1):
         emoji = "💵" if tr_type == 'income' else "💰"
         type_text = "Доход" if tr_type == 'income' else "Расход"
-        date_str = datetime.strptime(date, '%Y-%m-%d %H:%M:%S.%f').strftime('%d.%m.%Y %H:%M')
+        date_str = database.parse_date(date).strftime('%d.%m.%Y %H:%M')
 
         report += f"{i}. {emoji} *{type_text}: {amount:,.2f} руб.*\n"
         report += f"   🏷️ {category}\n"
@@ -497,15 +454,31 @@ async def generate_excel_report(update: Update, context: ContextTypes.DEFAULT_TY
         "📊 Выберите период для отчета:",
         reply_markup=get_period_keyboard()
     )
-    context.user_data['awaiting_period'] = True
+    context.user_data['awaiting_period'] = 'xlsx'
 
-async def create_excel_file(user_id: int, period: str) -> str:
-    """Создание Excel файла с данными за указанный период"""
-    db_path = os.path.join(os.path.expanduser("~"), 'finance.db')
-    conn = sqlite3.connect(db_path)
+async def export_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/export [csv|parquet] - выгрузка операций без форматирования"""
+    fmt = context.args[0].lower() if context.args else 'csv'
+    raw_formats = [name for name in reports.REPORT_FORMATS if name != 'xlsx']
 
-    # Определяем дату начала в зависимости от периода
+    if fmt not in raw_formats:
+        await update.message.reply_text(
+            f"❌ Доступные форматы: {', '.join(raw_formats)}",
+            reply_markup=get_main_keyboard()
+        )
+        return
+
+    await update.message.reply_text(
+        f"📄 Выберите период для выгрузки в {fmt.upper()}:",
+        reply_markup=get_period_keyboard()
+    )
+    context.user_data['awaiting_period'] = fmt
+
+async def create_report(user_id: int, period: str, fmt: str) -> Optional[bytes]:
+    """Создание файла отчета с данными за указанный период (в отдельном процессе)"""
+    # Определяем интервал [start_date, end_date) в зависимости от периода
     now = datetime.now()
+    end_date = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
     if period == 'today':
         start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
     elif period == 'week':
@@ -520,149 +493,12 @@ async def create_excel_file(user_id: int, period: str) -> str:
         start_date = datetime(2000, 1, 1)
 
     # Получаем данные из базы
-    query = '''
-        SELECT date, type, category, amount, description
-        FROM transactions
-        WHERE user_id = ? AND date >= ?
-        ORDER BY date DESC
-    '''
-
-    df = pd.read_sql_query(query, conn, params=(user_id, start_date))
-    conn.close()
-
-    if df.empty:
-        return None
-
-    # Преобразуем дату
-    df['date'] = pd.to_datetime(df['date'])
-    df['Дата'] = df['date'].dt.strftime('%d.%m.%Y %H:%M')
-
-    # Переименовываем колонки для лучшей читаемости
-    df = df.rename(columns={
-        'type': 'Тип',
-        'category': 'Категория',
-        'amount': 'Сумма',
-        'description': 'Описание'
-    })
-
-    # Создаем Excel файл
-    filename = f"finance_report_{user_id}_{period}.xlsx"
-    filepath = os.path.join(os.path.expanduser("~"), filename)
-
-    with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-        # ===== ЛИСТ 1: ДЕТАЛЬНЫЕ ДАННЫЕ =====
-        detailed_df = df[['Дата', 'Тип', 'Категория', 'Сумма', 'Описание']].copy()
-        detailed_df['Тип'] = detailed_df['Тип'].map({'income': 'Доход', 'expense': 'Расход'})
-        detailed_df.to_excel(writer, sheet_name='Детальные данные', index=False)
-
-        # Форматирование листа с детальными данными
-        worksheet = writer.sheets['Детальные данные']
-
-        # Устанавливаем ширину колонок
-        column_widths = [20, 10, 15, 15, 30]
-        for i, width in enumerate(column_widths, 1):
-            worksheet.column_dimensions[chr(64 + i)].width = width
-
-        # Добавляем заголовки жирным шрифтом
-        for col_num, value in enumerate(detailed_df.columns, 1):
-            cell = worksheet.cell(row=1, column=col_num)
-            cell.font = cell.font.copy(bold=True)
-
-        # Добавляем форматирование для сумм
-        for row in range(2, len(detailed_df) + 2):
-            cell = worksheet.cell(row=row, column=4)  # Колонка Сумма
-            cell.number_format = '#,##0.00" руб"'
-
-            # Цветовое кодирование: доходы - зеленый, расходы - красный
-            type_cell = worksheet.cell(row=row, column=2)  # Колонка Тип
-            if type_cell.value == 'Доход':
-                cell.font = cell.font.copy(color='FF008000')  # Зеленый
-            else:
-                cell.font = cell.font.copy(color='FFFF0000')  # Красный
-
-        # ===== ЛИСТ 2: СВОДКА ПО КАТЕГОРИЯМ =====
-        summary = df.groupby(['Тип', 'Категория']).agg({
-            'Сумма': ['sum', 'count']
-        }).round(2)
-        summary.columns = ['Сумма', 'Количество операций']
-        summary = summary.reset_index()
-        summary['Тип'] = summary['Тип'].map({'income': 'Доход', 'expense': 'Расход'})
-
-        summary.to_excel(writer, sheet_name='Сводка по категориям', index=False)
-
-        # Форматирование листа сводки
-        worksheet_summary = writer.sheets['Сводка по категориям']
-
-        # Ширина колонок
-        column_widths_summary = [10, 15, 15, 20]
-        for i, width in enumerate(column_widths_summary, 1):
-            worksheet_summary.column_dimensions[chr(64 + i)].width = width
-
-        # Жирные заголовки
-        for col_num, value in enumerate(summary.columns, 1):
-            cell = worksheet_summary.cell(row=1, column=col_num)
-            cell.font = cell.font.copy(bold=True)
-
-        # Форматирование сумм
-        for row in range(2, len(summary) + 2):
-            cell = worksheet_summary.cell(row=row, column=3)  # Колонка Сумма
-            cell.number_format = '#,##0.00" руб"'
-
-            cell = worksheet_summary.cell(row=row, column=4)  # Колонка Количество операций
-            cell.number_format = '0'
-
-        # ===== ЛИСТ 3: ОБЩАЯ СТАТИСТИКА =====
-        stats = df.groupby('Тип').agg({
-            'Сумма': ['sum', 'count', 'mean', 'max', 'min']
-        }).round(2)
-        stats.columns = ['Общая сумма', 'Количество операций', 'Средняя сумма', 'Максимальная сумма', 'Минимальная сумма']
-        stats = stats.reset_index()
-        stats['Тип'] = stats['Тип'].map({'income': 'Доход', 'expense': 'Расход'})
-
-        # Добавляем итоги
-        total_income = stats[stats['Тип'] == 'Доход']['Общая сумма'].sum()
-        total_expense = stats[stats['Тип'] == 'Расход']['Общая сумма'].sum()
-        balance = total_income - total_expense
-
-        stats.to_excel(writer, sheet_name='Общая статистика', index=False)
-
-        # Форматирование листа статистики
-        worksheet_stats = writer.sheets['Общая статистика']
-
-        # Ширина колонок
-        column_widths_stats = [15, 15, 20, 15, 20, 20]
-        for i, width in enumerate(column_widths_stats, 1):
-            worksheet_stats.column_dimensions[chr(64 + i)].width = width
-
-        # Жирные заголовки
-        for col_num, value in enumerate(stats.columns, 1):
-            cell = worksheet_stats.cell(row=1, column=col_num)
-            cell.font = cell.font.copy(bold=True)
-
-        # Форматирование чисел
-        for row in range(2, len(stats) + 2):
-            for col in range(2, 7):  # Колонки с числами
-                cell = worksheet_stats.cell(row=row, column=col)
-                if col == 3:  # Количество операций
-                    cell.number_format = '0'
-                else:
-                    cell.number_format = '#,##0.00" руб"'
-
-        # Добавляем строку с балансом
-        balance_row = len(stats) + 3
-        worksheet_stats.cell(row=balance_row, column=1, value='БАЛАНС:').font = cell.font.copy(bold=True)
-        worksheet_stats.cell(row=balance_row, column=2, value=balance).number_format = '#,##0.00" руб"'
-
-        if balance >= 0:
-            worksheet_stats.cell(row=balance_row, column=2).font = cell.font.copy(color='FF008000')
-        else:
-            worksheet_stats.cell(row=balance_row, column=2).font = cell.font.copy(color='FFFF0000')
-
-    return filepath
+    return await reports.create_report(user_id, start_date, end_date, fmt)
 
 async def handle_period_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработка выбора периода для Excel отчета"""
-    if not context.user_data.get('awaiting_period'):
+    """Обработка выбора периода для Excel отчета или выгрузки"""
+    fmt = context.user_data.get('awaiting_period')
+    if not fmt:
         return
 
     period_mapping = {
@@ -693,45 +529,104 @@ async def handle_period_selection(update: Update, context: ContextTypes.DEFAULT_
 
     period_key = period_mapping[user_choice]
 
-    await update.message.reply_text(
-        f"📊 Генерирую Excel отчет за {user_choice.lower()}...",
-        reply_markup=ReplyKeyboardRemove()
-    )
+    user_id = update.effective_user.id
+    context.user_data.pop('awaiting_period', None)
+
+    if reports.queue.is_pending(user_id):
+        await update.message.reply_text(
+            "⏳ Ваш предыдущий отчет еще готовится, он придет отдельным сообщением.",
+            reply_markup=get_main_keyboard()
+        )
+        return
 
     try:
-        filepath = await create_excel_file(update.effective_user.id, period_key)
+        position = reports.queue.submit(user_id, lambda: send_report(update, user_choice, period_key, fmt))
+    except reports.ReportQueueFull:
+        await update.message.reply_text(
+            "🚦 Сейчас формируется слишком много отчетов. Попробуйте через пару минут.",
+            reply_markup=get_main_keyboard()
+        )
+        return
 
-        if filepath is None:
-            await update.message.reply_text(
-                "❌ Нет данных за выбранный период.",
-                reply_markup=get_main_keyboard()
-            )
-        else:
-            # Отправляем файл пользователю
-            with open(filepath, 'rb') as file:
-                await update.message.reply_document(
-                    document=file,
-                    caption=f"📊 Excel отчет за {user_choice.lower()}\n\n"
-                        "Файл содержит 3 листа:\n"
-                        "📋 • Детальные данные - все операции с датами\n"
-                        "📈 • Сводка по категориям - группировка по типам и категориям\n"
-                        "📊 • Общая статистика - ключевые метрики и баланс\n\n"
-                        "💡 Файл автоматически отформатирован для удобного чтения",
+    if position:
+        await update.message.reply_text(
+            f"⏳ Отчет за {user_choice.lower()} поставлен в очередь (место: {position}). "
+            "Пришлю файл, как только он будет готов.",
+            reply_markup=get_main_keyboard()
+        )
+    else:
+        await update.message.reply_text(
+            f"📊 Генерирую {'Excel отчет' if fmt == 'xlsx' else 'выгрузку'} за {user_choice.lower()}... "
+            "Файл придет отдельным сообщением.",
+            reply_markup=get_main_keyboard()
+        )
+
+def get_report_caption(user_choice: str, fmt: str) -> str:
+    if fmt == 'xlsx':
+        return (
+            f"📊 Excel отчет за {user_choice.lower()}\n\n"
+            "Файл содержит 3 листа:\n"
+            "📋 • Детальные данные - все операции с датами\n"
+            "📈 • Сводка по категориям - группировка по типам и категориям\n"
+            "📊 • Общая статистика - ключевые метрики и баланс\n\n"
+            "💡 Файл автоматически отформатирован для удобного чтения"
+        )
+    return f"📄 Операции за {user_choice.lower()} в формате {fmt.upper()}"
+
+@metrics.timed('report')
+async def send_report(update: Update, user_choice: str, period_key: str, fmt: str):
+    """Задача очереди отчетов: берет файл из кэша или генерирует его и отправляет пользователю"""
+    user_id = update.effective_user.id
+    caption = get_report_caption(user_choice, fmt)
+    try:
+        # Версия данных в ключе: после любого изменения операций старый отчет не найдется
+        version = await database.get_data_version(user_id)
+        cache_key = report_cache.make_key(user_id, period_key, fmt, version)
+        cached = await report_cache.cache.get(cache_key)
+
+        content = None
+        if cached is not None:
+            if cached.file_id is not None:
+                # Файл уже загружен в Telegram - отправляем по file_id без повторной загрузки
+                try:
+                    await update.message.reply_document(
+                        document=cached.file_id,
+                        caption=caption,
+                        reply_markup=get_main_keyboard()
+                    )
+                    return
+                except BadRequest as e:
+                    logging.warning(f"Cached report file_id rejected: {e}")
+            content = await report_cache.cache.read(cached)
+
+        if content is None:
+            content = await create_report(user_id, period_key, fmt)
+
+            if content is None:
+                await update.message.reply_text(
+                    "❌ Нет данных за выбранный период.",
                     reply_markup=get_main_keyboard()
                 )
+                return
 
-            # Удаляем временный файл
-            os.remove(filepath)
+            await report_cache.cache.put(cache_key, user_id, content)
+
+        _, extension = reports.REPORT_FORMATS[fmt]
+        message = await update.message.reply_document(
+            document=content,
+            filename=f"finance_report_{user_id}_{period_key}.{extension}",
+            caption=caption,
+            reply_markup=get_main_keyboard()
+        )
+        await report_cache.cache.set_file_id(cache_key, message.document.file_id)
 
     except Exception as e:
-        logging.error(f"Excel generation error: {str(e)}")
+        logging.error(f"Report generation error ({fmt}): {str(e)}")
         await update.message.reply_text(
             "❌ Произошла ошибка при генерации отчета. Попробуйте позже.",
             reply_markup=get_main_keyboard()
         )
 
-    context.user_data.pop('awaiting_period', None)
-
 async def clear_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = ReplyKeyboardMarkup([
         ['✅ Да, очистить', '❌ Нет, отмена']
@@ -748,13 +643,9 @@ async def clear_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def confirm_clear(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.text == '✅ Да, очистить':
-        db_path = os.path.join(os.path.expanduser("~"), 'finance.db')
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('DELETE FROM transactions WHERE user_id = ?', (update.effective_user.id,))
-        conn.commit()
-        conn.close()
+        await database.clear_user_data(update.effective_user.id)
+        await ai_cache.cache.invalidate_user(update.effective_user.id)
+        await report_cache.cache.invalidate_user(update.effective_user.id)
 
         await update.message.reply_text(
             "🗑️ Все данные успешно удалены!",
@@ -768,6 +659,89 @@ async def confirm_clear(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     context.user_data.pop('awaiting_confirm', None)
 
+# Bot API отдает ботам файлы не больше 20 МБ
+IMPORT_MAX_FILE_SIZE = 20 * 1024 * 1024
+
+async def import_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Импорт операций из присланной выписки CSV/XLSX (в том числе Excel отчета бота)"""
+    document = update.message.document
+    fmt = (document.file_name or '').rsplit('.', 1)[-1].lower()
+    if fmt not in importer.READERS:
+        await update.message.reply_text(
+            "❌ Для импорта пришлите файл CSV или XLSX с колонками даты и суммы.",
+            reply_markup=get_main_keyboard()
+        )
+        return
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_SIZE:
+        await update.message.reply_text(
+            "❌ Файл больше 20 МБ - Telegram не дает ботам скачивать такие файлы. Разбейте его на части.",
+            reply_markup=get_main_keyboard()
+        )
+        return
+
+    await update.message.reply_text("📥 Импортирую операции из файла...")
+
+    user_id = update.effective_user.id
+    fd, path = tempfile.mkstemp(suffix=f'.{fmt}')
+    os.close(fd)
+    try:
+        file = await document.get_file()
+        await file.download_to_drive(path)
+        result = await importer.import_statement(
+            user_id, path, fmt, {'income': INCOME_CATEGORIES, 'expense': EXPENSE_CATEGORIES}
+        )
+    except importer.ImportFormatError as e:
+        await update.message.reply_text(f"❌ Не удалось разобрать файл: {e}", reply_markup=get_main_keyboard())
+        return
+    except Exception as e:
+        logging.error(f"Import error: {e}")
+        await update.message.reply_text(
+            "❌ Ошибка при импорте файла. Попробуйте позже.",
+            reply_markup=get_main_keyboard()
+        )
+        return
+    finally:
+        os.remove(path)
+
+    if result.imported:
+        await ai_cache.cache.invalidate_user(user_id)
+        await report_cache.cache.invalidate_user(user_id)
+
+    await update.message.reply_text(
+        f"✅ Импорт завершен!\n\n"
+        f"➕ Добавлено операций: {result.imported}\n"
+        f"🔁 Уже были в базе: {result.duplicates}\n"
+        f"⚠️ Пропущено строк без даты или суммы: {result.skipped}",
+        reply_markup=get_main_keyboard()
+    )
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile [секунды] - профиль процесса бота документом (только для ADMIN_IDS).
+
+    Повторная команда во время профилирования завершает его досрочно.
+    """
+    if profiling.profiler.running:
+        profiling.profiler.stop()
+        return
+
+    try:
+        seconds = float(context.args[0]) if context.args else profiling.PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        await update.message.reply_text("Использование: /profile [секунды]")
+        return
+    seconds = min(max(seconds, 1), profiling.PROFILE_MAX_SECONDS)
+
+    chat_id = update.effective_chat.id
+
+    async def send_profile(report: bytes, filename: str):
+        await context.bot.send_document(chat_id, document=report, filename=filename, caption="⏱ Профиль бота")
+
+    # Обработчик не ждет окончания: иначе следующие обновления администратора стояли бы в очереди
+    profiling.profiler.start(seconds, send_profile)
+    await update.message.reply_text(
+        f"⏱ Профилирование на {seconds:g} с. Отправьте /profile еще раз, чтобы завершить раньше."
+    )
+
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     help_text = """
 🤖 *ФИНАНСОВЫЙ ПОМОЩНИК - СПРАВКА*
@@ -789,6 +763,14 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 📅 Полгода - операции за последние 180 дней
 📅 Год - операции за последние 365 дней
 📅 Все время - все доступные данные
+
+*Выгрузка сырых данных:*
+/export - операции в CSV за выбранный период
+/export parquet - то же в формате Parquet (если установлен pyarrow)
+
+*Импорт операций:*
+Пришлите файл CSV или XLSX (выписку банка или Excel отчет бота) - операции
+добавятся автоматически, уже имеющиеся в базе будут пропущены
     """
 
     await update.message.reply_text(help_text, parse_mode='Markdown')
@@ -814,8 +796,30 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=get_main_keyboard()
         )
 
-def main():
-    application = Application.builder().token(TOKEN).build()
+async def on_startup(application: Application):
+    """После запуска: тяжелые модули отчетов загружаются в фоне, не задерживая первые ответы"""
+    reports.schedule_preload()
+    # В режиме webhook /metrics отдает его HTTP-сервер, в polling - отдельный локальный порт
+    await metrics.monitor.start(serve_http=BOT_MODE == 'polling')
+
+async def on_shutdown(application: Application):
+    """Освобождаем соединения с базой и OpenRouter при остановке бота"""
+    profiling.profiler.cancel()
+    await ai_client.close()
+    reports.shutdown()
+    logging.info(f"AI cache stats: {ai_cache.cache.stats()}")
+    logging.info(f"Report cache stats: {report_cache.cache.stats()}")
+    logging.info(f"Group commit stats: {database.writer.stats()}")
+    logging.info(f"OpenRouter breakers: {ai_client.stats()}")
+    await metrics.monitor.stop()
+    logging.info(f"Metrics: {metrics.format_summary()}")
+    if isinstance(application.update_processor, UserOrderedUpdateProcessor):
+        logging.info(f"Update processor stats: {application.update_processor.stats()}")
+    database.close()
+
+def build_application(builder: ApplicationBuilder) -> Application:
+    """Создает Application с обработчиками бота; builder уже настроен под режим запуска"""
+    application = builder.post_init(on_startup).post_shutdown(on_shutdown).build()
 
     conv_handler = ConversationHandler(
         entry_points=[
@@ -837,12 +841,19 @@ def main():
                 CommandHandler('skip', skip_description)
             ]
         },
-        fallbacks=[CommandHandler('cancel', cancel)]
+        fallbacks=[CommandHandler('cancel', cancel)],
+        # Шаги диалога сохраняются, если у Application есть persistence
+        name='transaction',
+        persistent=application.persistence is not None
     )
 
     application.add_handler(CommandHandler('start', start))
     application.add_handler(CommandHandler('cancel', cancel))
+    application.add_handler(CommandHandler('export', export_data))
+    # Без ADMIN_IDS фильтр не пропускает никого
+    application.add_handler(CommandHandler('profile', profile_command, filters=filters.User(user_id=ADMIN_IDS)))
     application.add_handler(conv_handler)
+    application.add_handler(MessageHandler(filters.Document.ALL, import_document))
     application.add_handler(MessageHandler(filters.Regex('^📊 Статистика$'), show_statistics))
     application.add_handler(MessageHandler(filters.Regex('^📋 Детальный отчет$'), detailed_report))
     application.add_handler(MessageHandler(filters.Regex('^📊 Excel отчет$'), generate_excel_report))
@@ -852,10 +863,65 @@ def main():
     application.add_handler(MessageHandler(filters.Regex('^💡 Совет от AI$'), ai_financial_tip))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
-    print("Бот запущен! Идите в Telegram и напишите /start вашему боту")
-    print("Для остановки нажмите Ctrl+C")
+    # Время и ошибки каждого обработчика - в метриках (bot_handler_duration_seconds),
+    # при TRACE_UPDATES каждое обновление получает трассу
+    metrics.instrument_handlers(application)
+    return application
+
+def get_update_processor():
+    """Разные пользователи - параллельно, обновления одного пользователя - по порядку"""
+    if CONCURRENT_UPDATES <= 1:
+        return 1
+    return UserOrderedUpdateProcessor(CONCURRENT_UPDATES, UPDATE_MAX_PENDING)
+
+class TracedRequest(HTTPXRequest):
+    """Запросы к Bot API как спаны трассы обновления (telegram.sendMessage и т.п.)"""
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        # Методы Bot API вызываются POST, скачивание файлов - GET
+        name = url.rsplit('/', 1)[-1] if method == 'POST' else 'download'
+        with tracing.span(f'telegram.{name}'):
+            return await super().do_request(url, method, request_data, *args, **kwargs)
+
+def get_builder(persistence: Optional[SQLitePersistence] = None) -> ApplicationBuilder:
+    """Настройки Application, общие для всех режимов запуска"""
+    builder = Application.builder().token(TOKEN).concurrent_updates(get_update_processor())
+    if TELEGRAM_API_URL:
+        builder = builder.base_url(TELEGRAM_API_URL)
+    if TELEGRAM_FILE_URL:
+        builder = builder.base_file_url(TELEGRAM_FILE_URL)
+    if TRACE_UPDATES:
+        # Размер пула - как у запроса по умолчанию в ApplicationBuilder
+        builder = builder.request(TracedRequest(connection_pool_size=256))
+    # user_data и шаги диалогов хранятся в общей базе, а не только в памяти процесса
+    return builder.persistence(persistence or SQLitePersistence())
 
-    application.run_polling()
+def main():
+    if BOT_MODE == 'cluster':
+        # Несколько процессов-воркеров за одним webhook, пользователи распределяются по user_id
+        import cluster
+
+        print(f"Бот запущен в режиме cluster: {CLUSTER_WORKERS} воркеров, порт {WEBHOOK_PORT}")
+        cluster.run(CLUSTER_WORKERS)
+        return
+
+    # Схема нужна до Application.initialize(): persistence загружает из базы user_data
+    database.init_db()
+    builder = get_builder()
+
+    if BOT_MODE == 'webhook':
+        # starlette/uvicorn нужны только в этом режиме
+        import webhook
+
+        # Обновления приходят на встроенный HTTP-сервер, Updater не нужен
+        application = build_application(builder.updater(None))
+        print(f"Бот запущен в режиме webhook на порту {WEBHOOK_PORT}")
+        webhook.run(application)
+    else:
+        application = build_application(builder)
+        print("Бот запущен! Идите в Telegram и напишите /start вашему боту")
+        print("Для остановки нажмите Ctrl+C")
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import multiprocessing
+import secrets
+import signal
+
+import uvicorn
+from telegram import Bot, Update
+
+import webhook
+from config import (
+    TOKEN, TELEGRAM_API_URL, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+)
+from persistence import SQLitePersistence, shard_of
+
+# Сколько ждать, пока воркер сохранит состояние и завершится
+WORKER_STOP_TIMEOUT = 30
+
+
+def get_user_id(data: dict) -> int:
+    """Пользователь, к которому относится обновление (по сырому JSON от Telegram).
+
+    Для обновлений без отправителя (посты в каналах) используется id чата.
+    """
+    for value in data.values():
+        if not isinstance(value, dict):
+            continue
+        user = value.get('from') or value.get('user')
+        if user:
+            return user['id']
+        chat = value.get('chat') or (value.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+    return 0
+
+
+# ===== ВОРКЕР =====
+
+def _worker_main(shard: int, shards: int, updates: multiprocessing.Queue):
+    """Точка входа процесса-воркера: свой Application для пользователей своего шарда"""
+    # Ctrl+C приходит всей группе процессов; останавливает воркеры ingress через очередь
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    import bot
+    import database
+
+    database.init_db()
+    application = bot.build_application(
+        bot.get_builder(SQLitePersistence(shard, shards)).updater(None)
+    )
+    asyncio.run(_serve_worker(application, updates))
+
+
+async def _serve_worker(application, updates: multiprocessing.Queue):
+    loop = asyncio.get_running_loop()
+
+    try:
+        async with application:
+            if application.post_init:
+                await application.post_init(application)
+            await application.start()
+            try:
+                while True:
+                    # Блокирующее чтение межпроцессной очереди - в потоке
+                    data = await loop.run_in_executor(None, updates.get)
+                    if data is None:
+                        break
+                    await application.update_queue.put(Update.de_json(data, application.bot))
+            finally:
+                await application.stop()
+        # shutdown() при выходе из async with сохранил user_data и состояния диалогов
+    finally:
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+# ===== INGRESS =====
+
+class Cluster:
+    """Процессы-воркеры и маршрутизация обновлений между ними по user_id.
+
+    Роль брокера играют multiprocessing.Queue - по одной на воркер.
+    """
+
+    def __init__(self, workers: int):
+        context = multiprocessing.get_context('spawn')
+        self.workers = workers
+        self.queues = [context.Queue() for _ in range(workers)]
+        self.routed = [0] * workers
+        self.processes = [
+            context.Process(target=_worker_main, args=(shard, workers, self.queues[shard]),
+                            name=f'bot-shard-{shard}')
+            for shard in range(workers)
+        ]
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        logging.info(f"Cluster started: {self.workers} workers")
+
+    async def dispatch(self, data: dict):
+        shard = shard_of(get_user_id(data), self.workers)
+        self.queues[shard].put(data)
+        self.routed[shard] += 1
+
+    def status(self):
+        workers = [
+            {'shard': shard, 'alive': process.is_alive(), 'routed': self.routed[shard]}
+            for shard, process in enumerate(self.processes)
+        ]
+        return all(worker['alive'] for worker in workers), {'workers': workers}
+
+    def stop(self):
+        for updates in self.queues:
+            updates.put(None)
+        for process in self.processes:
+            process.join(WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                logging.error(f"{process.name} did not stop in time, terminating")
+                process.terminate()
+
+
+async def serve(workers: int, url: str = WEBHOOK_URL, secret: str = WEBHOOK_SECRET,
+                host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT):
+    """Запускает воркеры и общий webhook до остановки сервера (SIGINT/SIGTERM)"""
+    secret = secret or secrets.token_urlsafe(32)
+    cluster = Cluster(workers)
+    server = webhook.Server(uvicorn.Config(
+        webhook.create_ingress_app(secret, cluster.dispatch, cluster.status),
+        host=host, port=port, log_level='warning', access_log=False
+    ))
+
+    cluster.start()
+    try:
+        bot = Bot(TOKEN, base_url=TELEGRAM_API_URL) if TELEGRAM_API_URL else Bot(TOKEN)
+        async with bot:
+            await webhook.register_webhook(bot, url, secret)
+        await server.serve()
+    finally:
+        cluster.stop()
+
+
+def run(workers: int):
+    asyncio.run(serve(workers))
@@ -9,4 +9,91 @@ load_dotenv()
 TOKEN = os.getenv('TOKEN')
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
 OPENROUTER_API_URL = os.getenv('OPENROUTER_API_URL')
-OPENROUTER_MODEL = os.getenv('OPENROUTER_MODEL')
\ No newline at end of file
+OPENROUTER_MODEL = os.getenv('OPENROUTER_MODEL')
+
+# Таймауты (в секундах) и размер пула соединений HTTP-клиента OpenRouter
+OPENROUTER_CONNECT_TIMEOUT = float(os.getenv('OPENROUTER_CONNECT_TIMEOUT', '5'))
+OPENROUTER_READ_TIMEOUT = float(os.getenv('OPENROUTER_READ_TIMEOUT', '15'))
+OPENROUTER_MAX_CONNECTIONS = int(os.getenv('OPENROUTER_MAX_CONNECTIONS', '20'))
+
+# Потоковый вывод AI-анализа: сообщение дописывается по мере генерации
+AI_STREAMING = os.getenv('AI_STREAMING', '1') == '1'
+# Минимальный интервал между правками сообщения (лимиты Telegram на редактирование)
+AI_STREAM_EDIT_INTERVAL = float(os.getenv('AI_STREAM_EDIT_INTERVAL', '1.5'))
+
+# Кэш ответов AI: время жизни записи (сек), размер LRU и хранение на диске (в finance.db)
+AI_CACHE_TTL = float(os.getenv('AI_CACHE_TTL', '3600'))
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', '1000'))
+AI_CACHE_PERSISTENT = os.getenv('AI_CACHE_PERSISTENT', '0') == '1'
+
+# Ограничения AI-запросов: одновременно выполняемые и ожидающие в очереди
+AI_MAX_CONCURRENT = int(os.getenv('AI_MAX_CONCURRENT', '5'))
+AI_MAX_QUEUE = int(os.getenv('AI_MAX_QUEUE', '50'))
+
+# Резервные модели (через запятую), которые пробуются по порядку, если OPENROUTER_MODEL недоступна
+OPENROUTER_FALLBACK_MODELS = [m.strip() for m in os.getenv('OPENROUTER_FALLBACK_MODELS', '').split(',') if m.strip()]
+# Повторы при 429/5xx и сетевых ошибках: число повторов и границы экспоненциальной задержки (сек)
+OPENROUTER_MAX_RETRIES = int(os.getenv('OPENROUTER_MAX_RETRIES', '2'))
+OPENROUTER_BACKOFF_BASE = float(os.getenv('OPENROUTER_BACKOFF_BASE', '0.5'))
+OPENROUTER_BACKOFF_MAX = float(os.getenv('OPENROUTER_BACKOFF_MAX', '8'))
+# Circuit breaker: доля ошибок в окне последних вызовов, после которой модель отключается на время
+BREAKER_ERROR_RATE = float(os.getenv('BREAKER_ERROR_RATE', '0.5'))
+BREAKER_WINDOW = int(os.getenv('BREAKER_WINDOW', '20'))
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', '5'))
+BREAKER_COOLDOWN = float(os.getenv('BREAKER_COOLDOWN', '30'))
+
+# Генерация отчетов: число процессов-воркеров и максимальная длина очереди
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+REPORT_MAX_PENDING = int(os.getenv('REPORT_MAX_PENDING', '20'))
+# Через сколько секунд после старта заранее поднять процесс отчетов с openpyxl (-1 - не поднимать)
+REPORT_PRELOAD_DELAY = float(os.getenv('REPORT_PRELOAD_DELAY', '10'))
+
+# Кэш готовых отчетов: каталог с файлами и ограничение его размера (МБ)
+REPORT_CACHE_DIR = os.getenv('REPORT_CACHE_DIR', os.path.join(os.path.expanduser('~'), 'finance_reports_cache'))
+REPORT_CACHE_MAX_MB = float(os.getenv('REPORT_CACHE_MAX_MB', '200'))
+
+# Режим получения обновлений: 'polling' (по умолчанию, для локального запуска) или 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# Публичный адрес сервиса; на Render берется из RENDER_EXTERNAL_URL
+WEBHOOK_URL = os.getenv('WEBHOOK_URL') or os.getenv('RENDER_EXTERNAL_URL')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+# Секрет для заголовка X-Telegram-Bot-Api-Secret-Token (если не задан - генерируется при запуске)
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('PORT', '8080'))
+# Сколько обновлений разных пользователей обрабатывается одновременно (1 - все последовательно).
+# Обновления одного пользователя всегда обрабатываются по порядку.
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '8'))
+# Сколько обновлений одновременно допускается в очереди пользователей и обработку. Прием
+# не останавливается: остальные ждут в задачах PTB и видны в статистике как throttled
+UPDATE_MAX_PENDING = int(os.getenv('UPDATE_MAX_PENDING', '1000'))
+
+# Адрес Bot API вместе с /bot (например, http://localhost:8081/bot для локального
+# telegram-bot-api сервера); по умолчанию - https://api.telegram.org/bot
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
+# Адрес для скачивания файлов (импорт выписок); по умолчанию - рядом с TELEGRAM_API_URL: .../file/bot
+TELEGRAM_FILE_URL = os.getenv('TELEGRAM_FILE_URL') or (
+    TELEGRAM_API_URL[:-len('bot')] + 'file/bot' if TELEGRAM_API_URL and TELEGRAM_API_URL.endswith('bot') else None
+)
+
+# Режим cluster: число процессов-воркеров, между которыми делятся пользователи
+CLUSTER_WORKERS = int(os.getenv('CLUSTER_WORKERS', '2'))
+
+# Как часто (сек) user_data и шаги диалогов записываются в базу одной транзакцией
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv('PERSISTENCE_FLUSH_INTERVAL', '10'))
+
+# Метрики: порт локального HTTP /metrics в режиме polling (0 - не поднимать; в режиме
+# webhook /metrics отдает основной сервер), период сводки в лог (0 - не писать) и
+# период замера опоздания event loop (секунды)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_LOG_INTERVAL = float(os.getenv('METRICS_LOG_INTERVAL', '0'))
+METRICS_LOOP_LAG_INTERVAL = float(os.getenv('METRICS_LOOP_LAG_INTERVAL', '0.5'))
+
+# Трассировка обновлений (спаны запросов к БД, OpenRouter и Bot API): включение и порог (сек),
+# после которого дерево спанов обработки обновления пишется в лог
+TRACE_UPDATES = os.getenv('TRACE_UPDATES', '0') == '1'
+TRACE_SLOW_THRESHOLD = float(os.getenv('TRACE_SLOW_THRESHOLD', '2'))
+
+# Telegram id администраторов через запятую: им доступна команда /profile
+ADMIN_IDS = [int(i) for i in os.getenv('ADMIN_IDS', '').split(',') if i.strip()]
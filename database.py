@@ -0,0 +1,675 @@
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+import metrics
+import tracing
+
+DB_PATH = os.path.join(os.path.expanduser("~"), 'finance.db')
+
+# Сколько соединений держим открытыми (и сколько потоков выполняют запросы)
+POOL_SIZE = 4
+
+# Настройки, которые применяются к каждому новому соединению.
+# WAL позволяет читать параллельно с записью, synchronous=NORMAL в режиме WAL
+# не теряет целостность и убирает fsync на каждый коммит, но последние коммиты
+# могут пропасть при сбое питания. Записи, о которых сообщается пользователю,
+# коммитятся через run_durable() с synchronous=FULL.
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',      # ~16 МБ страничного кэша на соединение
+    'PRAGMA mmap_size = 268435456',    # 256 МБ memory-mapped I/O
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA foreign_keys = ON',
+)
+
+# Единый формат хранения дат: ISO-текст фиксированной ширины (26 символов).
+# Строки в этом формате сравниваются так же, как сами даты, поэтому фильтры
+# по периоду записываются как диапазон [start, end) и используют индексы.
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def format_date(dt: datetime) -> str:
+    return dt.strftime(DATE_FORMAT)
+
+
+def parse_date(value: str) -> datetime:
+    return datetime.strptime(value, DATE_FORMAT)
+
+
+def month_bounds(dt: datetime):
+    """Полуоткрытый интервал [начало месяца, начало следующего месяца)"""
+    start = dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+class ConnectionPool:
+    """Небольшой пул долгоживущих соединений SQLite"""
+
+    def __init__(self, path: str, size: int):
+        self._path = path
+        self._size = size
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Соединение создается в одном потоке пула, а используется в любом из них
+        conn = sqlite3.connect(self._path, timeout=30, check_same_thread=False)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._all) < self._size:
+                conn = self._connect()
+                self._all.append(conn)
+                return conn
+
+        # Все соединения заняты - ждем освободившееся
+        return self._idle.get()
+
+    def release(self, conn: sqlite3.Connection):
+        self._idle.put(conn)
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+            self._idle = queue.LifoQueue()
+
+
+_pool = ConnectionPool(DB_PATH, POOL_SIZE)
+_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='db')
+
+
+def _run_sync(func, *args):
+    """Выполняет func(conn, *args) на соединении из пула в рамках одной транзакции"""
+    conn = _pool.acquire()
+    started = time.perf_counter()
+    try:
+        result = func(conn, *args)
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        metrics.db_query_duration.observe(time.perf_counter() - started, func.__name__)
+        _pool.release(conn)
+
+
+def _run_durable(func, *args):
+    """Как _run_sync, но коммит с synchronous=FULL: в режиме WAL с NORMAL закоммиченная
+    транзакция может пропасть при сбое питания или ОС, с FULL - WAL синхронизируется с диском"""
+    conn = _pool.acquire()
+    started = time.perf_counter()
+    try:
+        conn.execute('PRAGMA synchronous = FULL')
+        try:
+            result = func(conn, *args)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute('PRAGMA synchronous = NORMAL')
+    finally:
+        metrics.db_query_duration.observe(time.perf_counter() - started, func.__name__)
+        _pool.release(conn)
+
+
+async def run(func, *args):
+    """Выполняет func(conn, *args) в потоке БД, не блокируя event loop"""
+    loop = asyncio.get_running_loop()
+    # Спан включает ожидание свободного потока и соединения, а не только сам запрос
+    with tracing.span('db', query=func.__name__):
+        return await loop.run_in_executor(_executor, _run_sync, func, *args)
+
+
+async def run_durable(func, *args):
+    """Как run(), но возвращается только после fsync журнала (см. _run_durable)"""
+    loop = asyncio.get_running_loop()
+    with tracing.span('db durable', query=func.__name__):
+        return await loop.run_in_executor(_executor, _run_durable, func, *args)
+
+
+def close():
+    """Закрывает потоки и соединения (вызывается при остановке бота)"""
+    _executor.shutdown(wait=True)
+    _pool.close()
+
+
+def init_db():
+    """Создает схему и применяет недостающие миграции"""
+    _run_sync(_migrate)
+
+
+# ===== МИГРАЦИИ =====
+
+# Пересчет итогов по всем операциям (используется миграцией и командой rebuild)
+SUMMARY_REBUILD_SQL = '''
+    INSERT INTO transaction_summary (user_id, type, category, month, total, count)
+    SELECT user_id, type, category, substr(date, 1, 7), SUM(amount), COUNT(*)
+    FROM transactions
+    GROUP BY user_id, type, category, substr(date, 1, 7)
+'''
+
+# Каждая миграция - (версия, описание, список SQL-команд). Новые изменения схемы
+# добавляются в конец списка с очередным номером и применяются при старте бота.
+
+MIGRATIONS = [
+    (1, 'create transactions', [
+        '''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT NOT NULL,
+            description TEXT,
+            date TIMESTAMP NOT NULL
+        )
+        ''',
+    ]),
+    (2, 'transactions indexes', [
+        # Итоги по типу и выборки за период
+        'CREATE INDEX IF NOT EXISTS idx_transactions_user_type_date '
+        'ON transactions (user_id, type, date)',
+        # Покрывающий индекс для SUM/COUNT с GROUP BY category
+        # (ORDER BY amount по всем категориям им не покрывается - см. миграцию 8)
+        'CREATE INDEX IF NOT EXISTS idx_transactions_user_type_category_amount '
+        'ON transactions (user_id, type, category, amount)',
+        # Выгрузка всех операций пользователя за период
+        'CREATE INDEX IF NOT EXISTS idx_transactions_user_date '
+        'ON transactions (user_id, date)',
+    ]),
+    (3, 'normalize transaction dates', [
+        # Раньше дата писалась адаптером sqlite3: без дробной части, если
+        # микросекунды равны нулю, и иногда с разделителем 'T'.
+        # Приводим все строки к DATE_FORMAT.
+        '''
+        UPDATE transactions
+        SET date = substr(replace(date, 'T', ' '), 1, 19) || '.' ||
+                   substr(substr(replace(date, 'T', ' '), 21) || '000000', 1, 6)
+        WHERE length(date) != 26 OR instr(date, 'T') > 0
+        ''',
+    ]),
+    (4, 'transaction summary', [
+        # Итоги по пользователю, типу, категории и месяцу ('YYYY-MM').
+        # Поддерживаются в той же транзакции, что и изменения transactions.
+        '''
+        CREATE TABLE IF NOT EXISTS transaction_summary (
+            user_id INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT NOT NULL,
+            month TEXT NOT NULL,
+            total REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, type, category, month)
+        ) WITHOUT ROWID
+        ''',
+        SUMMARY_REBUILD_SQL,
+    ]),
+    (5, 'user data versions and AI cache', [
+        # Номер версии данных пользователя: растет при каждом изменении его операций.
+        # Используется кэшами как часть ключа.
+        '''
+        CREATE TABLE IF NOT EXISTS user_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        ''',
+        # Дисковый уровень кэша ответов AI (см. ai_cache.py)
+        '''
+        CREATE TABLE IF NOT EXISTS ai_cache (
+            key TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_ai_cache_user ON ai_cache (user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_ai_cache_accessed ON ai_cache (accessed_at)',
+    ]),
+    (6, 'report cache index', [
+        # Готовые файлы отчетов лежат в REPORT_CACHE_DIR, здесь - их индекс (см. report_cache.py)
+        '''
+        CREATE TABLE IF NOT EXISTS report_cache (
+            key TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            file_id TEXT,
+            accessed_at REAL NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_report_cache_user ON report_cache (user_id)',
+    ]),
+    (7, 'bot persistence', [
+        # user_data и состояния ConversationHandler (см. persistence.py), значения - JSON
+        '''
+        CREATE TABLE IF NOT EXISTS bot_user_data (
+            user_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS bot_conversations (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            PRIMARY KEY (name, key)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (8, 'largest expenses index', [
+        # Три самые крупные траты в снимке: поиск по (user_id, type) и чтение индекса
+        # с конца вместо сортировки всех расходов пользователя
+        'CREATE INDEX IF NOT EXISTS idx_transactions_user_type_amount '
+        'ON transactions (user_id, type, amount)',
+    ]),
+]
+
+
+def _migrate(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL
+        )
+    ''')
+    conn.commit()
+
+    applied = {row[0] for row in conn.execute('SELECT version FROM schema_migrations')}
+
+    for version, description, statements in MIGRATIONS:
+        if version in applied:
+            continue
+
+        # Каждая миграция применяется атомарно вместе с записью о ней
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Другой процесс мог применить миграцию, пока мы ждали блокировку
+            if conn.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,)).fetchone():
+                conn.rollback()
+                continue
+
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(
+                'INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)',
+                (version, description, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    # Обновляем статистику планировщика после изменений схемы
+    conn.execute('PRAGMA optimize')
+
+
+# ===== ГРУППОВАЯ ЗАПИСЬ =====
+
+# Сколько ждать попутных записей после первой (секунды) и максимум записей в одной транзакции
+GROUP_COMMIT_DELAY = 0.003
+GROUP_COMMIT_MAX_SIZE = 256
+
+
+def _run_group(conn, batch):
+    """Выполняет пачку записей одной транзакцией; ошибка одной записи не отменяет остальные"""
+    conn.execute('BEGIN IMMEDIATE')
+    results = []
+    for func, args in batch:
+        conn.execute('SAVEPOINT item')
+        try:
+            results.append((True, func(conn, *args)))
+        except Exception as e:
+            conn.execute('ROLLBACK TO item')
+            results.append((False, e))
+        conn.execute('RELEASE item')
+    return results
+
+
+class GroupCommitWriter:
+    """Очередь записей, которые коммитятся группами (group commit).
+
+    Записи разных пользователей копятся GROUP_COMMIT_DELAY секунд (или до
+    GROUP_COMMIT_MAX_SIZE штук) и выполняются одной транзакцией; пока она
+    коммитится, набирается следующая пачка. Пачка коммитится с synchronous=FULL
+    (run_durable), и submit() возвращает управление только после этого коммита:
+    подтверждение пользователю уходит для записи, которая переживет сбой питания.
+    Один fsync приходится на всю пачку, а не на каждую запись.
+    """
+
+    def __init__(self, delay: float = GROUP_COMMIT_DELAY, max_size: int = GROUP_COMMIT_MAX_SIZE):
+        self.delay = delay
+        self.max_size = max_size
+        self._pending = []
+        self._wakeup = None
+        self._task = None
+        self._loop = None
+        self.batches = 0
+        self.writes = 0
+
+    async def submit(self, func, *args):
+        """Ставит func(conn, *args) в очередь и ждет коммита его пачки"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Новый event loop (перезапуск приложения) - прежний писатель остался в старом
+            self._loop = loop
+            self._pending = []
+            self._wakeup = asyncio.Event()
+            self._task = None
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._writer())
+
+        future = loop.create_future()
+        self._pending.append((func, args, future))
+        self._wakeup.set()
+        with tracing.span('db group commit', query=func.__name__):
+            return await future
+
+    async def _writer(self):
+        # Писатель общий для всех обновлений: его пачки не относятся к трассе первого из них
+        tracing.detach()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._pending:
+                continue
+            # Даем попутным записям присоединиться к транзакции
+            if len(self._pending) < self.max_size and self.delay:
+                await asyncio.sleep(self.delay)
+
+            while self._pending:
+                batch = self._pending[:self.max_size]
+                del self._pending[:self.max_size]
+                await self._commit(batch)
+
+    async def _commit(self, batch):
+        try:
+            results = await run_durable(_run_group, [(func, args) for func, args, _ in batch])
+        except Exception as e:
+            # Не удался сам коммит - ошибка у всех записей пачки
+            results = [(False, e)] * len(batch)
+        self.batches += 1
+        self.writes += len(batch)
+
+        for (_, _, future), (ok, value) in zip(batch, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def stats(self) -> dict:
+        return {
+            'batches': self.batches,
+            'writes': self.writes,
+            'avg_batch': round(self.writes / self.batches, 1) if self.batches else 0,
+        }
+
+
+writer = GroupCommitWriter()
+
+
+# ===== ЗАПРОСЫ =====
+
+def _bump_version(conn, user_id):
+    conn.execute('''
+        INSERT INTO user_versions (user_id, version) VALUES (?, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+    ''', (user_id,))
+
+
+def _get_data_version(conn, user_id):
+    row = conn.execute('SELECT version FROM user_versions WHERE user_id = ?', (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+async def get_data_version(user_id: int) -> int:
+    """Версия данных пользователя (меняется при добавлении и удалении операций)"""
+    return await run(_get_data_version, user_id)
+
+
+def _add_transaction(conn, user_id, amount, tr_type, category, description):
+    date = format_date(datetime.now())
+    conn.execute('''
+        INSERT INTO transactions (user_id, amount, type, category, description, date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (user_id, amount, tr_type, category, description, date))
+
+    conn.execute('''
+        INSERT INTO transaction_summary (user_id, type, category, month, total, count)
+        VALUES (?, ?, ?, ?, ?, 1)
+        ON CONFLICT (user_id, type, category, month)
+        DO UPDATE SET total = total + excluded.total, count = count + 1
+    ''', (user_id, tr_type, category, date[:7], amount))
+
+    _bump_version(conn, user_id)
+
+
+async def add_transaction(user_id: int, amount: float, tr_type: str, category: str, description: str):
+    """Добавляет операцию; возвращается после коммита с fsync (записи группируются, см. GroupCommitWriter)"""
+    await writer.submit(_add_transaction, user_id, amount, tr_type, category, description)
+
+
+@dataclass(frozen=True)
+class FinancialSnapshot:
+    """Сводка по финансам пользователя для статистики и AI-подсказок"""
+    income: float
+    expense: float
+    income_month: float
+    expense_month: float
+    transactions_count: int
+    # (категория, сумма, количество операций), по убыванию суммы
+    expense_categories: Tuple[Tuple[str, float, int], ...]
+    # (категория, сумма, описание, дата) - три самые крупные траты
+    largest_expenses: Tuple[Tuple[str, float, str, str], ...]
+    # Версия данных пользователя на момент снимка
+    data_version: int = 0
+
+    @property
+    def balance(self) -> float:
+        return self.income - self.expense
+
+    @property
+    def month_balance(self) -> float:
+        return self.income_month - self.expense_month
+
+    @property
+    def fingerprint(self) -> str:
+        """Короткий отпечаток данных для ключей кэша"""
+        return f"{self.data_version}:{self.income:.2f}:{self.expense:.2f}:{self.transactions_count}"
+
+    @property
+    def top_category(self) -> Optional[Tuple[str, float, int]]:
+        return self.expense_categories[0] if self.expense_categories else None
+
+
+def _get_financial_snapshot(conn, user_id, with_largest=True):
+    current_month = datetime.now().strftime('%Y-%m')
+
+    # Один проход по итогам пользователя: суммы за все время и за текущий месяц
+    # считаются условной агрегацией, общие итоги складываются из категорий.
+    rows = conn.execute('''
+        SELECT type, category, SUM(total), SUM(count),
+               SUM(CASE WHEN month = ? THEN total ELSE 0 END)
+        FROM transaction_summary
+        WHERE user_id = ?
+        GROUP BY type, category
+    ''', (current_month, user_id)).fetchall()
+
+    totals = {'income': 0, 'expense': 0}
+    month_totals = {'income': 0, 'expense': 0}
+    transactions_count = 0
+    expense_categories = []
+
+    for tr_type, category, total, count, month_total in rows:
+        totals[tr_type] = totals.get(tr_type, 0) + total
+        month_totals[tr_type] = month_totals.get(tr_type, 0) + month_total
+        transactions_count += count
+        if tr_type == 'expense':
+            expense_categories.append((category, total, count))
+
+    expense_categories.sort(key=lambda item: item[1], reverse=True)
+
+    # Самые крупные траты: три строки с конца индекса (user_id, type, amount), без сортировки
+    largest_expenses = conn.execute('''
+        SELECT category, amount, description, date
+        FROM transactions
+        WHERE user_id = ? AND type = 'expense'
+        ORDER BY amount DESC
+        LIMIT 3
+    ''', (user_id,)).fetchall() if with_largest else []
+
+    return FinancialSnapshot(
+        income=totals['income'],
+        expense=totals['expense'],
+        income_month=month_totals['income'],
+        expense_month=month_totals['expense'],
+        transactions_count=transactions_count,
+        expense_categories=tuple(expense_categories),
+        largest_expenses=tuple(largest_expenses),
+        data_version=_get_data_version(conn, user_id),
+    )
+
+
+async def get_financial_snapshot(user_id: int, with_largest: bool = True) -> FinancialSnapshot:
+    """Итоги, итоги за месяц, категории расходов и крупные траты за одно обращение к БД.
+
+    with_largest=False - без запроса крупных трат (largest_expenses пуст), для статистики.
+    """
+    return await run(_get_financial_snapshot, user_id, with_largest)
+
+
+def _get_recent_transactions(conn, user_id, limit):
+    return conn.execute('''
+        SELECT type, amount, category, description, date
+        FROM transactions
+        WHERE user_id = ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (user_id, limit)).fetchall()
+
+
+async def get_recent_transactions(user_id: int, limit: int = 10):
+    return await run(_get_recent_transactions, user_id, limit)
+
+
+def iter_transactions_between(conn, user_id: int, start: datetime, end: datetime, chunk_size: int = 5000):
+    """Операции пользователя в интервале [start, end), новые сначала.
+
+    Строки читаются из курсора порциями по chunk_size, без загрузки всей выборки в память.
+    """
+    cursor = conn.execute('''
+        SELECT date, type, category, amount, description
+        FROM transactions
+        WHERE user_id = ? AND date >= ? AND date < ?
+        ORDER BY date DESC
+    ''', (user_id, format_date(start), format_date(end)))
+
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield from rows
+
+
+def _clear_user_data(conn, user_id):
+    conn.execute('DELETE FROM transactions WHERE user_id = ?', (user_id,))
+    conn.execute('DELETE FROM transaction_summary WHERE user_id = ?', (user_id,))
+    _bump_version(conn, user_id)
+
+
+async def clear_user_data(user_id: int):
+    # Пользователю сообщается об удалении - коммит с fsync, как у add_transaction
+    await run_durable(_clear_user_data, user_id)
+
+
+# ===== ОБСЛУЖИВАНИЕ ИТОГОВ =====
+
+def rebuild_summary():
+    """Полностью пересчитывает transaction_summary по таблице transactions"""
+    def _rebuild(conn):
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('DELETE FROM transaction_summary')
+        conn.execute(SUMMARY_REBUILD_SQL)
+
+    _run_sync(_rebuild)
+
+
+def verify_summary(tolerance: float = 0.005):
+    """Сравнивает transaction_summary с пересчетом по transactions.
+
+    Возвращает список расхождений (ключ, (total, count) в итогах, (total, count) в операциях).
+    """
+    def _verify(conn):
+        expected = {
+            row[:4]: row[4:] for row in conn.execute('''
+                SELECT user_id, type, category, substr(date, 1, 7), SUM(amount), COUNT(*)
+                FROM transactions
+                GROUP BY user_id, type, category, substr(date, 1, 7)
+            ''')
+        }
+        actual = {
+            row[:4]: row[4:] for row in conn.execute(
+                'SELECT user_id, type, category, month, total, count FROM transaction_summary'
+            )
+        }
+
+        mismatches = []
+        for key in sorted(expected.keys() | actual.keys()):
+            stored = actual.get(key)
+            computed = expected.get(key)
+            if stored is None or computed is None \
+                    or stored[1] != computed[1] or abs(stored[0] - computed[0]) > tolerance:
+                mismatches.append((key, stored, computed))
+        return mismatches
+
+    return _run_sync(_verify)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Обслуживание базы финансового бота')
+    parser.add_argument('command', choices=['migrate', 'rebuild-summary', 'verify-summary'])
+    args = parser.parse_args()
+
+    init_db()
+
+    if args.command == 'rebuild-summary':
+        rebuild_summary()
+        print('Итоги пересчитаны')
+    elif args.command == 'verify-summary':
+        mismatches = verify_summary()
+        for key, stored, computed in mismatches:
+            print(f'{key}: в итогах {stored}, по операциям {computed}')
+        print(f'Расхождений: {len(mismatches)}')
+        raise SystemExit(1 if mismatches else 0)
+    else:
+        print('Миграции применены')
@@ -0,0 +1,318 @@
+import asyncio
+import codecs
+import csv
+import sqlite3
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import database
+
+# Сколько строк файла вставляется во временную таблицу за один executemany
+CHUNK_SIZE = 5000
+
+# Где искать строку заголовка (у выписок банков перед таблицей бывает шапка)
+HEADER_SEARCH_ROWS = 30
+
+# Названия колонок (в нижнем регистре): экспорт бота (CSV и лист "Детальные данные") и типичные выписки
+COLUMN_ALIASES = {
+    'date': ('date', 'дата', 'дата операции', 'дата платежа', 'дата и время'),
+    'type': ('type', 'тип', 'тип операции'),
+    'category': ('category', 'категория'),
+    'amount': ('amount', 'сумма', 'сумма операции', 'сумма платежа', 'сумма в валюте счета'),
+    'description': ('description', 'описание', 'назначение платежа', 'комментарий'),
+}
+
+TYPE_ALIASES = {
+    'income': 'income', 'доход': 'income', 'пополнение': 'income', 'зачисление': 'income',
+    'expense': 'expense', 'расход': 'expense', 'списание': 'expense', 'покупка': 'expense',
+}
+
+DATE_FORMATS = (
+    database.DATE_FORMAT,
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%d',
+    '%d.%m.%Y %H:%M:%S',
+    '%d.%m.%Y %H:%M',
+    '%d.%m.%Y',
+)
+
+# Операция для вставки: (дата, тип, категория, сумма, описание)
+Row = Tuple[str, str, str, float, str]
+
+
+class ImportFormatError(Exception):
+    """Файл не удалось разобрать как выписку"""
+
+
+class ImportResult(NamedTuple):
+    imported: int
+    duplicates: int
+    skipped: int
+
+
+# ===== ЧТЕНИЕ ФАЙЛОВ =====
+
+def _iter_csv(path: str) -> Iterator[tuple]:
+    with open(path, 'rb') as raw:
+        sample = raw.read(65536)
+    try:
+        # Инкрементальный декодер не спотыкается о символ, обрезанный границей образца
+        codecs.getincrementaldecoder('utf-8')().decode(sample)
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        # Выписки российских банков часто в Windows-1251
+        encoding = 'cp1251'
+
+    with open(path, encoding=encoding, errors='replace', newline='') as text:
+        # Разделитель - самый частый из возможных в начале файла (запятая в суммах "1 234,56" реже)
+        sample = ''.join(islice(text, HEADER_SEARCH_ROWS))
+        delimiter = max(',;\t', key=sample.count)
+        text.seek(0)
+        yield from csv.reader(text, delimiter=delimiter)
+
+
+def _iter_xlsx(path: str) -> Iterator[tuple]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        # Отчет самого бота: операции на листе "Детальные данные"
+        sheet = workbook['Детальные данные'] if 'Детальные данные' in workbook.sheetnames else workbook.active
+        yield from sheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+READERS = {
+    'csv': _iter_csv,
+    'xlsx': _iter_xlsx,
+}
+
+
+def _find_columns(rows: Iterator[tuple]) -> Dict[str, int]:
+    """Ищет строку заголовка и возвращает поле -> номер колонки"""
+    for header in islice(rows, HEADER_SEARCH_ROWS):
+        names = [str(value).strip().lower() if value is not None else '' for value in header]
+        columns = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            for index, name in enumerate(names):
+                if name in aliases:
+                    columns[field] = index
+                    break
+        if 'date' in columns and 'amount' in columns:
+            return columns
+    raise ImportFormatError('не найдены колонки с датой и суммой')
+
+
+# ===== РАЗБОР ЗНАЧЕНИЙ =====
+
+def _strip_emoji(category: str) -> str:
+    # '🍔 Еда' -> 'еда'
+    head, _, tail = category.partition(' ')
+    name = tail if tail and not head.isalnum() else category
+    return name.strip().lower()
+
+
+class RowParser:
+    """Приводит строки файла к формату таблицы transactions"""
+
+    def __init__(self, columns: Dict[str, int], categories: Dict[str, List[str]]):
+        self.columns = columns
+        self.categories = categories
+        # Название без эмодзи -> категория бота; все неизвестное попадает в последнюю ("Прочее")
+        self.category_names = {
+            tr_type: {_strip_emoji(category): category for category in names}
+            for tr_type, names in categories.items()
+        }
+        self.date_format = None
+
+    def _cell(self, row, field):
+        index = self.columns.get(field)
+        if index is None or index >= len(row):
+            return None
+        return row[index]
+
+    def parse_date(self, value) -> Optional[datetime]:
+        if isinstance(value, datetime):
+            return value
+        if value is None:
+            return None
+        value = str(value).strip()
+        # Формат почти всегда одинаков во всем файле - пробуем найденный первым
+        if self.date_format is not None:
+            try:
+                return datetime.strptime(value, self.date_format)
+            except ValueError:
+                pass
+        for date_format in DATE_FORMATS:
+            try:
+                date = datetime.strptime(value, date_format)
+            except ValueError:
+                continue
+            self.date_format = date_format
+            return date
+        return None
+
+    @staticmethod
+    def parse_amount(value) -> Optional[float]:
+        if isinstance(value, (int, float)):
+            return float(value)
+        if value is None:
+            return None
+        value = str(value)
+        for garbage in ('\xa0', ' ', 'руб.', 'руб', '₽'):
+            value = value.replace(garbage, '')
+        try:
+            return float(value.replace(',', '.'))
+        except ValueError:
+            return None
+
+    def map_category(self, value, tr_type: str) -> str:
+        names = self.categories[tr_type]
+        if value in names:
+            return value
+        if value:
+            category = self.category_names[tr_type].get(_strip_emoji(str(value)))
+            if category is not None:
+                return category
+        return names[-1]
+
+    def parse(self, row) -> Optional[Row]:
+        date = self.parse_date(self._cell(row, 'date'))
+        amount = self.parse_amount(self._cell(row, 'amount'))
+        if date is None or not amount:
+            return None
+
+        tr_type = TYPE_ALIASES.get(str(self._cell(row, 'type') or '').strip().lower())
+        if tr_type is None:
+            # Без колонки типа знак суммы отделяет списания от зачислений
+            tr_type = 'expense' if amount < 0 else 'income'
+
+        description = self._cell(row, 'description')
+        return (
+            database.format_date(date),
+            tr_type,
+            self.map_category(self._cell(row, 'category'), tr_type),
+            round(abs(amount), 2),
+            str(description).strip() if description is not None else '',
+        )
+
+
+# ===== ЗАПИСЬ =====
+
+# Операции сравниваются с точностью до минуты: в Excel-отчете бота секунд нет
+DEDUP_KEY = 'substr(date, 1, 16), type, category, amount, description'
+
+
+def _write(conn, user_id: int, rows: Iterator[Row]) -> Tuple[int, int]:
+    """Вставляет новые операции одной транзакцией. Возвращает (добавлено, дубликатов)"""
+    conn.execute('''
+        CREATE TEMP TABLE import_rows (date TEXT, type TEXT, category TEXT, amount REAL, description TEXT)
+    ''')
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            break
+        conn.executemany('INSERT INTO import_rows VALUES (?, ?, ?, ?, ?)', chunk)
+    conn.commit()
+
+    # Сверка с базой и вставка - под блокировкой записи, чтобы никто не вклинился между ними
+    conn.execute('BEGIN IMMEDIATE')
+    # Одинаковые операции считаются поштучно: n-я копия в файле - дубликат, если в базе есть n копий
+    conn.execute(f'''
+        CREATE TEMP TABLE import_existing AS
+        SELECT substr(date, 1, 16) AS minute, type, category, amount, description,
+               ROW_NUMBER() OVER (PARTITION BY {DEDUP_KEY}) AS n
+        FROM transactions
+        WHERE user_id = ?
+          AND date >= (SELECT substr(MIN(date), 1, 16) FROM import_rows)
+          AND date < (SELECT substr(MAX(date), 1, 16) || '~' FROM import_rows)
+    ''', (user_id,))
+    conn.execute('CREATE INDEX temp.import_existing_key ON import_existing (minute, amount, type, category, description, n)')
+    conn.execute(f'''
+        CREATE TEMP TABLE import_new AS
+        SELECT date, type, category, amount, description FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY {DEDUP_KEY}) AS n FROM import_rows
+        ) AS incoming
+        WHERE NOT EXISTS (
+            SELECT 1 FROM import_existing AS e
+            WHERE e.minute = substr(incoming.date, 1, 16) AND e.amount = incoming.amount
+              AND e.type = incoming.type AND e.category = incoming.category
+              AND e.description = incoming.description AND e.n = incoming.n
+        )
+    ''')
+
+    conn.execute('''
+        INSERT INTO transactions (user_id, amount, type, category, description, date)
+        SELECT ?, amount, type, category, description, date FROM import_new ORDER BY date
+    ''', (user_id,))
+    # WHERE true: без него SQLite принимает ON CONFLICT за часть SELECT
+    conn.execute('''
+        INSERT INTO transaction_summary (user_id, type, category, month, total, count)
+        SELECT ?, type, category, substr(date, 1, 7), SUM(amount), COUNT(*)
+        FROM import_new WHERE true
+        GROUP BY type, category, substr(date, 1, 7)
+        ON CONFLICT (user_id, type, category, month)
+        DO UPDATE SET total = total + excluded.total, count = count + excluded.count
+    ''', (user_id,))
+
+    total = conn.execute('SELECT COUNT(*) FROM import_rows').fetchone()[0]
+    imported = conn.execute('SELECT COUNT(*) FROM import_new').fetchone()[0]
+    if imported:
+        database._bump_version(conn, user_id)
+    conn.commit()
+    return imported, total - imported
+
+
+def import_file(db_path: str, path: str, fmt: str, user_id: int, categories: Dict[str, List[str]]) -> ImportResult:
+    """Импортирует операции из CSV/XLSX. Выполняется в пуле процессов отчетов.
+
+    Файл читается потоково и попадает в базу пачками по CHUNK_SIZE строк, поэтому
+    память не зависит от его размера. Уже имеющиеся операции пропускаются.
+    """
+    rows = READERS[fmt](path)
+    try:
+        parser = RowParser(_find_columns(rows), categories)
+
+        skipped = 0
+
+        def parsed():
+            nonlocal skipped
+            for row in rows:
+                result = parser.parse(row)
+                if result is None:
+                    # Пустые строки, итоги и прочие строки без даты и суммы
+                    if any(value not in (None, '') for value in row):
+                        skipped += 1
+                    continue
+                yield result
+
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            for pragma in database.PRAGMAS:
+                conn.execute(pragma)
+            # Временные таблицы импорта растут с размером файла - пусть уходят на диск, а не в память
+            conn.execute('PRAGMA temp_store = FILE')
+            imported, duplicates = _write(conn, user_id, parsed())
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    finally:
+        rows.close()
+
+    return ImportResult(imported, duplicates, skipped)
+
+
+async def import_statement(user_id: int, path: str, fmt: str, categories: Dict[str, List[str]]) -> ImportResult:
+    """Импорт в пуле процессов отчетов, не блокируя event loop"""
+    import reports
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        reports.get_process_pool(), import_file,
+        database.DB_PATH, path, fmt, user_id, categories
+    )
@@ -0,0 +1,326 @@
+import asyncio
+import bisect
+import functools
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import tracing
+from config import METRICS_HOST, METRICS_PORT, METRICS_LOG_INTERVAL, METRICS_LOOP_LAG_INTERVAL
+
+# Границы корзин гистограмм задержек, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    """Метрика с набором меток; значения хранятся по кортежу значений меток.
+
+    Запись идет и из event loop, и из потоков БД, поэтому изменения - под блокировкой.
+    """
+
+    kind = ''
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.extend(self._render_value(label_values, value))
+        return lines
+
+    def _render_value(self, label_values, value) -> list:
+        return [f'{self.name}{_format_labels(self.labels, label_values)} {value}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, *label_values):
+        self._values[label_values] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *label_values):
+        # Счетчики по корзинам хранятся не накопительно: одно увеличение на наблюдение
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, label_values, state) -> list:
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}')
+        labels = _format_labels(self.labels, label_values)
+        lines.append(f'{self.name}_sum{labels} {total}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+    def summary(self) -> Dict[tuple, dict]:
+        """Метки -> количество, среднее и оценки p50/p95 (верхняя граница корзины)"""
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+
+        result = {}
+        for label_values, (counts, total, count) in values.items():
+            result[label_values] = {
+                'count': count,
+                'avg': total / count if count else 0,
+                'p50': self._quantile(counts, count, 0.5),
+                'p95': self._quantile(counts, count, 0.95),
+            }
+        return result
+
+    def _quantile(self, counts, count, q) -> float:
+        threshold = q * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            if cumulative >= threshold:
+                return bound
+        return float('inf')
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+handler_duration = registry.register(Histogram(
+    'bot_handler_duration_seconds', 'Время работы обработчика обновления', ('handler',)))
+handler_errors = registry.register(Counter(
+    'bot_handler_errors_total', 'Исключения в обработчиках', ('handler', 'error')))
+operation_duration = registry.register(Histogram(
+    'bot_operation_duration_seconds', 'Время операций вне обработчиков (отчеты, AI-ответы)', ('operation',)))
+db_query_duration = registry.register(Histogram(
+    'bot_db_query_seconds', 'Время выполнения запроса к SQLite в потоке БД (с коммитом)', ('query',)))
+openrouter_duration = registry.register(Histogram(
+    'bot_openrouter_request_seconds', 'Время попытки запроса к OpenRouter (до заголовков ответа для потока)',
+    ('model', 'outcome')))
+openrouter_breaker_state = registry.register(Gauge(
+    'bot_openrouter_breaker_state', 'Состояние circuit breaker модели: 0 - closed, 1 - half_open, 2 - open',
+    ('model',)))
+openrouter_tokens = registry.register(Counter(
+    'bot_openrouter_tokens_total', 'Токены OpenRouter по данным usage', ('model', 'kind')))
+loop_lag = registry.register(Histogram(
+    'bot_event_loop_lag_seconds', 'Опоздание периодической задачи event loop относительно расписания',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)))
+loop_lag_last = registry.register(Gauge(
+    'bot_event_loop_lag_last_seconds', 'Последнее измеренное опоздание event loop'))
+
+
+# ===== ИНСТРУМЕНТИРОВАНИЕ =====
+
+def _timed_callback(callback, name: str):
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            if tracing.enabled:
+                with tracing.Trace(name, update):
+                    return await callback(update, context)
+            return await callback(update, context)
+        except Exception as e:
+            handler_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            handler_duration.observe(time.perf_counter() - started, name)
+    return wrapper
+
+
+def _iter_handlers(handlers):
+    # Модуль импортируется и процессами отчетов (через database), им telegram не нужен
+    from telegram.ext import ConversationHandler
+
+    # Обработчики ConversationHandler (точки входа, состояния, fallbacks) оборачиваются по отдельности
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            yield from _iter_handlers(handler.entry_points)
+            for state_handlers in handler.states.values():
+                yield from _iter_handlers(state_handlers)
+            yield from _iter_handlers(handler.fallbacks)
+        else:
+            yield handler
+
+
+def instrument_handlers(application):
+    """Оборачивает callback каждого зарегистрированного обработчика замером времени и ошибок
+    (и трассой обновления, если включена трассировка)"""
+    for handlers in application.handlers.values():
+        for handler in _iter_handlers(handlers):
+            if not getattr(handler.callback, '_instrumented', False):
+                handler.callback = _timed_callback(handler.callback, handler.callback.__name__)
+                handler.callback._instrumented = True
+
+
+def timed(operation: str):
+    """Декоратор корутины: время выполнения в bot_operation_duration_seconds и спан в трассе"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with tracing.span(operation):
+                    return await func(*args, **kwargs)
+            finally:
+                operation_duration.observe(time.perf_counter() - started, operation)
+        return wrapper
+    return decorator
+
+
+def record_usage(model: str, usage: Optional[dict]):
+    """Учитывает поле usage из ответа OpenRouter"""
+    if not usage:
+        return
+    for kind in ('prompt_tokens', 'completion_tokens'):
+        if usage.get(kind):
+            openrouter_tokens.inc(model, kind[:-len('_tokens')], amount=usage[kind])
+
+
+# ===== ФОНОВЫЕ ЗАДАЧИ =====
+
+async def _watch_loop_lag(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        loop_lag.observe(lag)
+        loop_lag_last.set(lag)
+
+
+def format_summary() -> str:
+    """Короткая сводка для лога: обработчики, запросы к БД и AI, опоздание event loop"""
+    parts = []
+    for title, histogram in (('handlers', handler_duration), ('operations', operation_duration),
+                             ('db', db_query_duration), ('openrouter', openrouter_duration)):
+        items = sorted(histogram.summary().items(), key=lambda item: -item[1]['count'])
+        if items:
+            parts.append(f"{title}: " + ', '.join(
+                f"{'/'.join(labels)} n={s['count']} avg={s['avg'] * 1000:.1f}ms p95<={s['p95'] * 1000:g}ms"
+                for labels, s in items
+            ))
+
+    errors = sorted(handler_errors._values.items())
+    if errors:
+        parts.append('errors: ' + ', '.join(f"{'/'.join(labels)}={int(count)}" for labels, count in errors))
+    tokens = sorted(openrouter_tokens._values.items())
+    if tokens:
+        parts.append('tokens: ' + ', '.join(f"{'/'.join(labels)}={int(count)}" for labels, count in tokens))
+    lag = loop_lag.summary().get(())
+    if lag:
+        parts.append(f"loop lag: avg={lag['avg'] * 1000:.1f}ms p95<={lag['p95'] * 1000:g}ms")
+    return '; '.join(parts) or 'no data'
+
+
+async def _log_summary(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        logging.info(f"Metrics: {format_summary()}")
+
+
+async def _handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    # Минимальный HTTP/1.0: только GET /metrics (в режиме webhook маршрут есть в webhook.py)
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()).strip():
+            pass
+        parts = request_line.decode('latin-1').split()
+        if len(parts) >= 2 and parts[0] == 'GET' and parts[1] == '/metrics':
+            status, body = '200 OK', registry.render().encode()
+        else:
+            status, body = '404 Not Found', b'not found\n'
+        writer.write(
+            f'HTTP/1.0 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n'.encode() + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+class Monitor:
+    """Фоновые задачи метрик: замер опоздания event loop, сводка в лог, HTTP /metrics"""
+
+    def __init__(self):
+        self._tasks = []
+        self._server = None
+
+    async def start(self, serve_http: bool = False, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        loop = asyncio.get_running_loop()
+        if METRICS_LOOP_LAG_INTERVAL > 0:
+            self._tasks.append(loop.create_task(_watch_loop_lag(METRICS_LOOP_LAG_INTERVAL)))
+        if METRICS_LOG_INTERVAL > 0:
+            self._tasks.append(loop.create_task(_log_summary(METRICS_LOG_INTERVAL)))
+        if serve_http and port:
+            self._server = await asyncio.start_server(_handle_http, host, port)
+            logging.info(f"Metrics available at http://{host}:{port}/metrics")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+monitor = Monitor()
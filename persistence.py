@@ -0,0 +1,153 @@
+import asyncio
+import json
+from typing import Dict, Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import database
+from config import PERSISTENCE_FLUSH_INTERVAL
+
+
+def shard_of(user_id: int, shards: int) -> int:
+    """Номер воркера, который обслуживает пользователя"""
+    return user_id % shards
+
+
+class SQLitePersistence(BasePersistence):
+    """Хранит user_data и состояния ConversationHandler в общей базе finance.db.
+
+    Значения сериализуются в JSON, поэтому в user_data должны лежать только
+    простые типы. Application передает изменения раз в update_interval секунд;
+    все изменения одного прохода записываются одной транзакцией.
+
+    При запуске нескольких воркеров (shard из shards) каждый загружает только
+    своих пользователей; пользователь всегда попадает в один и тот же воркер,
+    поэтому записи разных процессов не пересекаются.
+    """
+
+    def __init__(self, shard: int = 0, shards: int = 1, update_interval: float = PERSISTENCE_FLUSH_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.shard = shard
+        self.shards = shards
+        # Несохраненные изменения: user_id -> JSON (None - удалить), (name, key) -> (user_id, JSON или None)
+        self._user_data_writes = {}
+        self._conversation_writes = {}
+        self._batch = None
+        self._flush_lock = asyncio.Lock()
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        rows = await database.run(_load_user_data, self.shard, self.shards)
+        loads = json.loads
+        return {user_id: loads(data) for user_id, data in rows}
+
+    async def get_conversations(self, name: str) -> dict:
+        rows = await database.run(_load_conversations, name, self.shard, self.shards)
+        loads = json.loads
+        return {tuple(loads(key)): loads(state) for key, state in rows}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        # Ключ ConversationHandler по умолчанию - (chat_id, user_id)
+        state = json.dumps(new_state) if new_state is not None else None
+        self._conversation_writes[(name, json.dumps(key))] = (key[-1], state)
+        await self._write_batch()
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._user_data_writes[user_id] = json.dumps(data, ensure_ascii=False)
+        await self._write_batch()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._user_data_writes[user_id] = None
+        await self._write_batch()
+
+    async def _write_batch(self):
+        """Ждет общую запись накопленных изменений.
+
+        Application вызывает update_* для всех изменений одновременно (gather), поэтому
+        запись откладывается на один проход event loop - к этому моменту отметятся все.
+        """
+        if self._batch is None:
+            self._batch = asyncio.ensure_future(self._flush_next_tick())
+        await asyncio.shield(self._batch)
+
+    async def _flush_next_tick(self):
+        await asyncio.sleep(0)
+        self._batch = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Записывает все накопленные изменения одной транзакцией"""
+        async with self._flush_lock:
+            if not self._user_data_writes and not self._conversation_writes:
+                return
+            user_data, self._user_data_writes = self._user_data_writes, {}
+            conversations, self._conversation_writes = self._conversation_writes, {}
+            await database.run(_save_batch, user_data, conversations)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    # Остальные виды данных бот не хранит
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+
+def _load_user_data(conn, shard, shards):
+    # Идентификаторы пользователей Telegram положительные, поэтому % в SQL совпадает с shard_of
+    return conn.execute(
+        'SELECT user_id, data FROM bot_user_data WHERE user_id % ? = ?', (shards, shard)
+    ).fetchall()
+
+
+def _load_conversations(conn, name, shard, shards):
+    return conn.execute(
+        'SELECT key, state FROM bot_conversations WHERE name = ? AND user_id % ? = ?', (name, shards, shard)
+    ).fetchall()
+
+
+def _save_batch(conn, user_data, conversations):
+    conn.executemany('''
+        INSERT INTO bot_user_data (user_id, data) VALUES (?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET data = excluded.data
+    ''', [(user_id, data) for user_id, data in user_data.items() if data is not None])
+    conn.executemany(
+        'DELETE FROM bot_user_data WHERE user_id = ?',
+        [(user_id,) for user_id, data in user_data.items() if data is None]
+    )
+
+    conn.executemany('''
+        INSERT INTO bot_conversations (name, key, user_id, state) VALUES (?, ?, ?, ?)
+        ON CONFLICT (name, key) DO UPDATE SET state = excluded.state
+    ''', [(name, key, user_id, state) for (name, key), (user_id, state) in conversations.items()
+          if state is not None])
+    conn.executemany(
+        'DELETE FROM bot_conversations WHERE name = ? AND key = ?',
+        [(name, key) for (name, key), (user_id, state) in conversations.items() if state is None]
+    )
@@ -0,0 +1,110 @@
+import asyncio
+import cProfile
+import importlib.util
+import io
+import logging
+import pstats
+import time
+from typing import Awaitable, Callable, Optional
+
+PYINSTRUMENT_AVAILABLE = importlib.util.find_spec('pyinstrument') is not None
+
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 600
+# Сколько строк статистики cProfile попадает в отчет
+CPROFILE_REPORT_LINES = 60
+
+
+class Profiler:
+    """Профилирование потока event loop на заданное время (команда /profile).
+
+    С установленным pyinstrument профиль семплирующий (накладные расходы малы и
+    видно время ожидания в корутинах), иначе - cProfile из стандартной библиотеки.
+    Одновременно идет не больше одного профилирования; stop() завершает его досрочно.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, seconds: float, on_report: Callable[[bytes, str], Awaitable[None]]):
+        """Запускает профилирование; по окончании отчет передается в on_report(текст, имя файла)"""
+        self._stop = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run(seconds, on_report))
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+
+    def cancel(self):
+        """При остановке бота: профилирование прерывается без отправки отчета"""
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self, seconds: float, on_report: Callable[[bytes, str], Awaitable[None]]):
+        started = time.monotonic()
+        collector = _PyinstrumentCollector() if PYINSTRUMENT_AVAILABLE else _CProfileCollector()
+        collector.start()
+        try:
+            try:
+                await asyncio.wait_for(self._stop.wait(), seconds)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            collector.stop()
+
+        elapsed = time.monotonic() - started
+        header = f"Profile of event loop thread, {elapsed:.1f}s, {collector.name}\n\n"
+        filename = f"profile_{time.strftime('%Y%m%d_%H%M%S')}.txt"
+        try:
+            await on_report((header + collector.report()).encode(), filename)
+        except Exception as e:
+            logging.error(f"Failed to send profile report: {e}")
+
+
+class _CProfileCollector:
+    name = 'cProfile'
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def report(self) -> str:
+        output = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=output)
+        stats.strip_dirs()
+        for key in ('cumulative', 'tottime'):
+            output.write(f"===== sorted by {key} =====\n")
+            stats.sort_stats(key).print_stats(CPROFILE_REPORT_LINES)
+        return output.getvalue()
+
+
+class _PyinstrumentCollector:
+    name = 'pyinstrument'
+
+    def __init__(self):
+        from pyinstrument import Profiler as PyinstrumentProfiler
+
+        # async_mode='disabled': профилируется весь поток, а не только задача, запустившая профилирование
+        self._profiler = PyinstrumentProfiler(interval=0.001, async_mode='disabled')
+
+    def start(self):
+        self._profiler.start()
+
+    def stop(self):
+        self._profiler.stop()
+
+    def report(self) -> str:
+        return self._profiler.output_text(unicode=True, color=False)
+
+
+profiler = Profiler()
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import time
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+import database
+from config import REPORT_CACHE_DIR, REPORT_CACHE_MAX_MB
+
+
+def make_key(user_id: int, period: str, fmt: str, data_version: int) -> str:
+    """Ключ кэша отчета.
+
+    Периоды отсчитываются от текущего момента, поэтому в ключ входит и дата:
+    на следующий день тот же период дает другой набор операций.
+    """
+    day = datetime.now().strftime('%Y-%m-%d')
+    return f"{user_id}:{period}:{fmt}:{data_version}:{day}"
+
+
+class CachedReport(NamedTuple):
+    key: str
+    path: str
+    file_id: Optional[str]
+
+
+class ReportCache:
+    """LRU-кэш готовых файлов отчетов на диске, ограниченный суммарным размером.
+
+    Кроме самого файла запоминается file_id документа в Telegram: повторная
+    отправка по file_id не требует загрузки файла.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    async def get(self, key: str) -> Optional[CachedReport]:
+        entry = await database.run(_disk_get, key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    async def read(self, entry: CachedReport) -> Optional[bytes]:
+        """Содержимое файла из кэша (None, если файл пропал с диска)"""
+        return await database.run(_read_file, entry.path)
+
+    async def put(self, key: str, user_id: int, content: bytes):
+        path = os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+        await database.run(_disk_put, key, user_id, path, content, self.max_bytes)
+
+    async def set_file_id(self, key: str, file_id: str):
+        await database.run(_disk_set_file_id, key, file_id)
+
+    async def invalidate_user(self, user_id: int):
+        """Удаляет все отчеты пользователя (его данные изменились)"""
+        await database.run(_disk_invalidate_user, user_id)
+
+
+def _read_file(conn, path):
+    try:
+        with open(path, 'rb') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _disk_get(conn, key):
+    row = conn.execute('SELECT path, file_id FROM report_cache WHERE key = ?', (key,)).fetchone()
+    if row is None:
+        return None
+
+    conn.execute('UPDATE report_cache SET accessed_at = ? WHERE key = ?', (time.time(), key))
+    return CachedReport(key, row[0], row[1])
+
+
+def _disk_put(conn, key, user_id, path, content, max_bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Пишем во временный файл и переименовываем, чтобы не оставить полузаписанный отчет
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+
+    conn.execute('''
+        INSERT OR REPLACE INTO report_cache (key, user_id, path, size, file_id, accessed_at)
+        VALUES (?, ?, ?, ?, NULL, ?)
+    ''', (key, user_id, path, len(content), time.time()))
+
+    # Вытесняем давно не использованные отчеты, пока не уложимся в лимит
+    evicted = []
+    total = 0
+    for old_key, old_path, size in conn.execute(
+        'SELECT key, path, size FROM report_cache ORDER BY accessed_at DESC'
+    ).fetchall():
+        total += size
+        if total > max_bytes and old_key != key:
+            evicted.append((old_key, old_path))
+
+    conn.executemany('DELETE FROM report_cache WHERE key = ?', [(k,) for k, _ in evicted])
+    _remove_files(p for _, p in evicted)
+
+
+def _disk_set_file_id(conn, key, file_id):
+    conn.execute('UPDATE report_cache SET file_id = ? WHERE key = ?', (file_id, key))
+
+
+def _disk_invalidate_user(conn, user_id):
+    paths = [row[0] for row in conn.execute('SELECT path FROM report_cache WHERE user_id = ?', (user_id,))]
+    conn.execute('DELETE FROM report_cache WHERE user_id = ?', (user_id,))
+    _remove_files(paths)
+
+
+cache = ReportCache(REPORT_CACHE_DIR, int(REPORT_CACHE_MAX_MB * 2 ** 20))
@@ -0,0 +1,352 @@
+import asyncio
+import csv
+import importlib.util
+import io
+import logging
+import multiprocessing
+import sqlite3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import chain, islice
+from typing import Awaitable, Callable, Hashable, Optional
+
+import aggregation
+import database
+import tracing
+from config import REPORT_WORKERS, REPORT_MAX_PENDING, REPORT_PRELOAD_DELAY
+
+
+# openpyxl (вместе с numpy, если он установлен) импортируется ~0.3 с, а нужен только процессам, которые
+# собирают Excel, поэтому он загружается внутри функций, а не при старте бота.
+
+# Стили ячеек создаются один раз на книгу и применяются по имени
+MONEY_FORMAT = '#,##0.00" руб"'
+TYPE_LABELS = {'income': 'Доход', 'expense': 'Расход'}
+
+
+def _named_styles():
+    from openpyxl.styles import Font, NamedStyle
+
+    return [
+        NamedStyle(name='header', font=Font(bold=True)),
+        NamedStyle(name='money', number_format=MONEY_FORMAT),
+        NamedStyle(name='money_income', number_format=MONEY_FORMAT, font=Font(color='FF008000')),
+        NamedStyle(name='money_expense', number_format=MONEY_FORMAT, font=Font(color='FFFF0000')),
+        NamedStyle(name='count', number_format='0'),
+    ]
+
+
+def _create_sheet(workbook, title, headers, widths):
+    from openpyxl.utils import get_column_letter
+
+    sheet = workbook.create_sheet(title)
+    for i, width in enumerate(widths, 1):
+        sheet.column_dimensions[get_column_letter(i)].width = width
+    sheet.append([_styled(sheet, header, 'header') for header in headers])
+    return sheet
+
+
+def _styled(sheet, value, style):
+    from openpyxl.cell import WriteOnlyCell
+
+    cell = WriteOnlyCell(sheet, value=value)
+    cell.style = style
+    return cell
+
+
+def build_excel_report(db_path: str, user_id: int, start_date: datetime, end_date: datetime) -> Optional[bytes]:
+    """Excel отчет с операциями за [start_date, end_date), собранный в памяти.
+
+    Выполняется в отдельном процессе, поэтому сам открывает соединение с базой.
+    Строки читаются из курсора порциями и сразу пишутся в книгу в режиме write-only,
+    итоги для сводных листов считаются в том же проходе (aggregation.Totals), поэтому
+    память не зависит от числа операций.
+    """
+    from openpyxl import Workbook
+
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        rows = database.iter_transactions_between(conn, user_id, start_date, end_date)
+        first_row = next(rows, None)
+        if first_row is None:
+            return None
+
+        workbook = Workbook(write_only=True)
+        for style in _named_styles():
+            workbook.add_named_style(style)
+
+        # ===== ЛИСТ 1: ДЕТАЛЬНЫЕ ДАННЫЕ =====
+        detailed = _create_sheet(
+            workbook, 'Детальные данные',
+            ['Дата', 'Тип', 'Категория', 'Сумма', 'Описание'],
+            [20, 10, 15, 15, 30]
+        )
+
+        totals = aggregation.Totals()
+        for date_str, tr_type, category, amount, description in aggregation.iter_detail(
+                chain([first_row], rows), totals):
+            detailed.append([
+                date_str,
+                TYPE_LABELS.get(tr_type),
+                category,
+                _styled(detailed, amount, 'money_income' if tr_type == 'income' else 'money_expense'),
+                description,
+            ])
+    finally:
+        conn.close()
+
+    # ===== ЛИСТ 2: СВОДКА ПО КАТЕГОРИЯМ =====
+    summary = _create_sheet(
+        workbook, 'Сводка по категориям',
+        ['Тип', 'Категория', 'Сумма', 'Количество операций'],
+        [10, 15, 15, 20]
+    )
+    for item in totals.category_totals():
+        summary.append([
+            TYPE_LABELS.get(item.type),
+            item.category,
+            _styled(summary, round(item.total, 2), 'money'),
+            _styled(summary, item.count, 'count'),
+        ])
+
+    # ===== ЛИСТ 3: ОБЩАЯ СТАТИСТИКА =====
+    stats = _create_sheet(
+        workbook, 'Общая статистика',
+        ['Тип', 'Общая сумма', 'Количество операций', 'Средняя сумма', 'Максимальная сумма', 'Минимальная сумма'],
+        [15, 15, 20, 15, 20, 20]
+    )
+    for item in totals.type_stats():
+        stats.append([
+            TYPE_LABELS.get(item.type),
+            _styled(stats, round(item.total, 2), 'money'),
+            _styled(stats, item.count, 'count'),
+            _styled(stats, round(item.mean, 2), 'money'),
+            _styled(stats, round(item.maximum, 2), 'money'),
+            _styled(stats, round(item.minimum, 2), 'money'),
+        ])
+
+    # Добавляем строку с балансом (после пустой строки)
+    balance = round(totals.total('income'), 2) - round(totals.total('expense'), 2)
+
+    stats.append([])
+    stats.append([
+        _styled(stats, 'БАЛАНС:', 'header'),
+        _styled(stats, balance, 'money_income' if balance >= 0 else 'money_expense'),
+    ])
+
+    # Файл собирается в памяти и целиком возвращается в основной процесс
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+
+    return buffer.getvalue()
+
+
+# ===== ВЫГРУЗКА СЫРЫХ ДАННЫХ =====
+
+RAW_COLUMNS = ['date', 'type', 'category', 'amount', 'description']
+
+
+def build_csv_report(db_path: str, user_id: int, start_date: datetime, end_date: datetime) -> Optional[bytes]:
+    """Операции за [start_date, end_date) в CSV без форматирования и сводных листов"""
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        rows = database.iter_transactions_between(conn, user_id, start_date, end_date)
+        first_row = next(rows, None)
+        if first_row is None:
+            return None
+
+        buffer = io.BytesIO()
+        # utf-8-sig: Excel без BOM показывает кириллицу в CSV неправильно
+        text = io.TextIOWrapper(buffer, encoding='utf-8-sig', newline='')
+        writer = csv.writer(text)
+        writer.writerow(RAW_COLUMNS)
+        writer.writerow(first_row)
+        writer.writerows(rows)
+        text.flush()
+    finally:
+        conn.close()
+
+    return buffer.getvalue()
+
+
+def build_parquet_report(db_path: str, user_id: int, start_date: datetime, end_date: datetime,
+                         chunk_size: int = 50000) -> Optional[bytes]:
+    """Операции за [start_date, end_date) в Parquet, по группе строк на каждые chunk_size операций"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('date', pa.string()),
+        ('type', pa.string()),
+        ('category', pa.string()),
+        ('amount', pa.float64()),
+        ('description', pa.string()),
+    ])
+
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        rows = database.iter_transactions_between(conn, user_id, start_date, end_date)
+        buffer = io.BytesIO()
+        writer = None
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            if writer is None:
+                writer = pq.ParquetWriter(buffer, schema)
+            columns = [list(column) for column in zip(*chunk)]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+    finally:
+        conn.close()
+
+    if writer is None:
+        return None
+    writer.close()
+    return buffer.getvalue()
+
+
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+# Формат -> (функция сборки, расширение файла)
+REPORT_FORMATS = {
+    'xlsx': (build_excel_report, 'xlsx'),
+    'csv': (build_csv_report, 'csv'),
+}
+if PARQUET_AVAILABLE:
+    REPORT_FORMATS['parquet'] = (build_parquet_report, 'parquet')
+
+
+# ===== ПУЛ ПРОЦЕССОВ =====
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn: дочерние процессы не наследуют потоки БД и event loop родителя
+        _process_pool = ProcessPoolExecutor(
+            max_workers=REPORT_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _process_pool
+
+
+async def create_report(user_id: int, start_date: datetime, end_date: datetime,
+                        fmt: str = 'xlsx') -> Optional[bytes]:
+    """Генерирует отчет в пуле процессов, не блокируя event loop.
+
+    Возвращает содержимое файла или None, если за период нет операций.
+    """
+    build, _ = REPORT_FORMATS[fmt]
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_process_pool(), build,
+        database.DB_PATH, user_id, start_date, end_date
+    )
+
+
+def _preload():
+    import openpyxl  # noqa: F401
+
+
+_preload_task: Optional[asyncio.Task] = None
+
+
+async def _preload_after(delay: float):
+    await asyncio.sleep(delay)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(get_process_pool(), _preload)
+    logging.info("Report worker preloaded")
+
+
+def schedule_preload(delay: float = REPORT_PRELOAD_DELAY):
+    """Заранее запускает процесс пула и загружает в нем openpyxl, чтобы первый отчет не ждал.
+
+    Выполняется в фоне через delay секунд после старта - когда бот уже отвечает.
+    """
+    global _preload_task
+    if delay >= 0 and _preload_task is None:
+        _preload_task = asyncio.get_running_loop().create_task(_preload_after(delay))
+
+
+def shutdown():
+    global _process_pool, _preload_task
+    if _preload_task is not None:
+        _preload_task.cancel()
+        _preload_task = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+# ===== ОЧЕРЕДЬ ЗАДАЧ =====
+
+class ReportQueueFull(Exception):
+    """В очереди отчетов нет места"""
+
+
+class ReportQueue:
+    """Очередь задач генерации отчетов.
+
+    Одновременно выполняется не больше workers задач, остальные ждут по порядку.
+    На каждый ключ (пользователя) допускается только одна ожидающая или выполняемая задача.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.running = 0
+        self._waiting = deque()
+        self._keys = set()
+        self._tasks = set()
+
+    def is_pending(self, key: Hashable) -> bool:
+        return key in self._keys
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiting)
+
+    def submit(self, key: Hashable, job: Callable[[], Awaitable]) -> int:
+        """Ставит задачу в очередь. Возвращает позицию в очереди (0 - задача уже запущена)"""
+        if key in self._keys:
+            raise ValueError(f"job for {key!r} is already pending")
+        if len(self._waiting) >= self.max_pending:
+            raise ReportQueueFull()
+
+        self._keys.add(key)
+        if self.running < self.workers:
+            self._start(key, job)
+            return 0
+
+        self._waiting.append((key, job))
+        return len(self._waiting)
+
+    def _start(self, key, job):
+        self.running += 1
+        task = asyncio.ensure_future(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(lambda t: self._finished(key, t))
+
+    @staticmethod
+    async def _run(job):
+        # Задача стартует в контексте обработчика или callback-а предыдущей задачи;
+        # ее спаны не должны попадать в чужую (уже завершенную) трассу
+        tracing.detach()
+        return await job()
+
+    def _finished(self, key, task):
+        self._tasks.discard(task)
+        self._keys.discard(key)
+        self.running -= 1
+
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Report job for {key!r} failed: {task.exception()}")
+
+        if self._waiting:
+            self._start(*self._waiting.popleft())
+
+
+queue = ReportQueue(REPORT_WORKERS, REPORT_MAX_PENDING)
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+
+from telegram import Message
+from telegram.error import BadRequest, RetryAfter
+
+# Telegram ограничивает длину сообщения 4096 символами, оставляем запас
+MESSAGE_LIMIT = 4000
+
+
+class StreamingMessage:
+    """Сообщение, которое постепенно дописывается по мере генерации ответа.
+
+    Правки отправляются не чаще одного раза в min_interval секунд, чтобы не
+    упираться в лимиты Telegram на редактирование. Когда текст превышает
+    MESSAGE_LIMIT, он переносится в новое сообщение.
+    """
+
+    def __init__(self, reply_to: Message, header: str = "", min_interval: float = 1.5,
+                 limit: int = MESSAGE_LIMIT):
+        self._reply_to = reply_to
+        self._min_interval = min_interval
+        self._limit = limit
+        self._message = None
+        self._text = header
+        self._sent_text = None
+        self._last_edit = 0.0
+        self._received = False
+
+    @property
+    def has_content(self) -> bool:
+        return self._message is not None
+
+    async def start(self, placeholder: str):
+        """Отправляет начальное сообщение, которое затем будет редактироваться"""
+        self._message = await self._reply_to.reply_text(placeholder)
+        self._sent_text = placeholder
+        self._last_edit = time.monotonic()
+
+    async def append(self, chunk: str):
+        self._received = True
+        self._text += chunk
+
+        while len(self._text) > self._limit:
+            await self._roll_over()
+
+        if time.monotonic() - self._last_edit >= self._min_interval:
+            await self._edit(self._text)
+
+    async def finish(self):
+        """Отправляет последнюю версию текста без ожидания интервала"""
+        if self._text:
+            await self._edit(self._text, wait=True)
+
+    async def fail(self, note: str):
+        """Завершает вывод ошибкой: note заменяет заглушку или дописывается к уже выведенной части"""
+        if not self._received:
+            await self._edit(note, wait=True)
+            return
+
+        self._text += f"\n\n{note}"
+        while len(self._text) > self._limit:
+            await self._roll_over()
+        await self._edit(self._text, wait=True)
+
+    async def _roll_over(self):
+        # Режем по концу предложения или строки, чтобы не рвать слова
+        cut = max(self._text.rfind('. ', 0, self._limit), self._text.rfind('\n', 0, self._limit))
+        cut = cut + 1 if cut > 0 else self._limit
+
+        head, self._text = self._text[:cut], self._text[cut:].lstrip()
+        await self._edit(head, wait=True)
+
+        self._message = await self._reply_to.reply_text(self._text[:self._limit] or '…')
+        self._sent_text = self._text[:self._limit] or '…'
+        self._last_edit = time.monotonic()
+
+    async def _edit(self, text: str, wait: bool = False):
+        if self._message is None:
+            await self.start(text)
+            return
+        if text == self._sent_text:
+            return
+
+        try:
+            await self._message.edit_text(text)
+            self._sent_text = text
+        except RetryAfter as e:
+            logging.warning(f"Streaming edit throttled for {e.retry_after}s")
+            if not wait:
+                # Промежуточную правку пропускаем, следующая придет позже
+                self._last_edit = time.monotonic() + float(e.retry_after)
+                return
+            await asyncio.sleep(float(e.retry_after))
+            await self._message.edit_text(text)
+            self._sent_text = text
+        except BadRequest as e:
+            if 'not modified' not in str(e).lower():
+                raise
+        self._last_edit = time.monotonic()
@@ -0,0 +1,122 @@
+import contextvars
+import logging
+import secrets
+import time
+from typing import Optional
+
+from config import TRACE_UPDATES, TRACE_SLOW_THRESHOLD
+
+# Включение проверяется при каждом обновлении; без трассировки спаны ничего не делают
+enabled = TRACE_UPDATES
+
+# Текущий спан обработки обновления; наследуется задачами, созданными внутри обработчика
+_current: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('trace_span', default=None)
+
+
+class Span:
+    __slots__ = ('name', 'attrs', 'start', 'duration', 'error', 'children')
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self.children = []
+
+    def format(self, origin: float, depth: int = 0) -> list:
+        """Строки дерева: смещение от начала трассы, длительность, имя и атрибуты"""
+        duration = f'{self.duration * 1000:9.1f}ms' if self.duration is not None else '  running  '
+        attrs = ' '.join(f'{key}={value}' for key, value in self.attrs.items())
+        error = f' !{self.error}' if self.error else ''
+        lines = [f"+{(self.start - origin) * 1000:8.1f}ms {duration}  {'  ' * depth}{self.name} {attrs}{error}".rstrip()]
+        for child in self.children:
+            lines.extend(child.format(origin, depth + 1))
+        return lines
+
+
+class _SpanScope:
+    """Контекстный менеджер дочернего спана (без генератора - дешевле на горячем пути)"""
+
+    __slots__ = ('parent', 'span', 'token')
+
+    def __init__(self, parent: Span, name: str, attrs: dict):
+        self.parent = parent
+        self.span = Span(name, attrs)
+
+    def __enter__(self) -> Span:
+        self.parent.children.append(self.span)
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.duration = time.perf_counter() - self.span.start
+        if exc_type is not None:
+            self.span.error = exc_type.__name__
+        _current.reset(self.token)
+        return False
+
+
+class _NullScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SCOPE = _NullScope()
+
+
+def span(name: str, **attrs):
+    """Спан внутри трассы текущего обновления; вне трассы - пустой контекст"""
+    parent = _current.get()
+    if parent is None:
+        return _NULL_SCOPE
+    return _SpanScope(parent, name, attrs)
+
+
+def detach():
+    """Отвязывает текущую задачу от трассы обновления.
+
+    Вызывается в начале фоновых задач, которые переживают обработчик, создавший их
+    (задача наследует контекст): иначе их спаны копятся в давно завершенной трассе.
+    """
+    _current.set(None)
+
+
+class Trace:
+    """Трасса обработки обновления: корневой спан с trace id.
+
+    Если обработка заняла больше TRACE_SLOW_THRESHOLD секунд, дерево спанов пишется в лог.
+    """
+
+    def __init__(self, name: str, update=None, threshold: float = None):
+        self.trace_id = secrets.token_hex(8)
+        self.threshold = TRACE_SLOW_THRESHOLD if threshold is None else threshold
+        attrs = {}
+        user = getattr(update, 'effective_user', None)
+        if user is not None:
+            attrs['user'] = user.id
+        if getattr(update, 'update_id', None) is not None:
+            attrs['update'] = update.update_id
+        self.root = Span(name, attrs)
+
+    def __enter__(self) -> 'Trace':
+        self.token = _current.set(self.root)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.root.duration = time.perf_counter() - self.root.start
+        if exc_type is not None:
+            self.root.error = exc_type.__name__
+        _current.reset(self.token)
+        if self.root.duration >= self.threshold:
+            logging.warning(f"Slow update, trace {self.trace_id}: {self.root.duration * 1000:.1f}ms\n{self.format()}")
+        return False
+
+    def format(self) -> str:
+        return '\n'.join(self.root.format(self.root.start))
+
@@ -0,0 +1,111 @@
+import asyncio
+from typing import Any, Awaitable, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений разных пользователей с сохранением порядка
+    внутри каждого пользователя.
+
+    Обновления одного пользователя выполняются строго по очереди (от этого зависят
+    шаги ConversationHandler и флаги в user_data), разные пользователи - параллельно,
+    но не больше workers одновременно.
+
+    max_pending - семафор BaseUpdateProcessor: сколько обновлений одновременно попадает
+    в do_process_update (в очереди пользователя или в обработку). Прием при этом не
+    останавливается: PTB забирает каждое обновление из update_queue и создает для него
+    задачу, лишние ждут семафор. Они учитываются в stats() (pending, throttled), чтобы
+    перегрузка была видна. Место в очереди пользователя занимается до первого await
+    в do_process_update, а семафор пропускает задачи по порядку, поэтому порядок
+    совпадает с порядком поступления обновлений.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        super().__init__(max_pending)
+        self.workers = workers
+        self._slots = asyncio.Semaphore(workers)
+        # ключ пользователя -> future последнего обновления в его очереди
+        self._tails = {}
+        self._depths = {}
+        self.pending = 0
+        self.admitted = 0
+        self.running = 0
+        self.processed = 0
+        self.max_pending_seen = 0
+
+    @staticmethod
+    def get_key(update: object) -> Optional[Hashable]:
+        if isinstance(update, Update):
+            if update.effective_user is not None:
+                return update.effective_user.id
+            if update.effective_chat is not None:
+                return ('chat', update.effective_chat.id)
+        return None
+
+    def stats(self) -> dict:
+        """Глубина очередей: всего принято, выполняется, ждут своей очереди пользователя или
+        воркера, ждут за пределом max_pending"""
+        return {
+            'pending': self.pending,
+            'running': self.running,
+            'waiting': self.admitted - self.running,
+            'throttled': self.pending - self.admitted,
+            'users': len(self._depths),
+            'max_user_depth': max(self._depths.values(), default=0),
+            'max_pending_seen': self.max_pending_seen,
+            'processed': self.processed,
+        }
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        # Учет до семафора: иначе обновления сверх max_pending не видны в stats()
+        self.pending += 1
+        self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        try:
+            await super().process_update(update, coroutine)
+        finally:
+            self.pending -= 1
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self.get_key(update)
+        self.admitted += 1
+
+        # До первого await: встаем в очередь пользователя в порядке поступления
+        previous = self._tails.get(key) if key is not None else None
+        done = asyncio.get_running_loop().create_future()
+        if key is not None:
+            self._tails[key] = done
+            self._depths[key] = self._depths.get(key, 0) + 1
+
+        try:
+            if previous is not None:
+                # shield: отмена этого обновления не должна отменять ожидание у соседей
+                await asyncio.shield(previous)
+
+            async with self._slots:
+                self.running += 1
+                try:
+                    await coroutine
+                finally:
+                    self.running -= 1
+                    self.processed += 1
+        finally:
+            self.admitted -= 1
+            if previous is not None and not previous.done():
+                # Обновление отменили, пока оно ждало: следующие все равно ждут предыдущее
+                previous.add_done_callback(lambda _: done.set_result(None))
+            else:
+                done.set_result(None)
+            if key is not None:
+                self._depths[key] -= 1
+                if not self._depths[key]:
+                    del self._depths[key]
+                if self._tails.get(key) is done:
+                    del self._tails[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,136 @@
+import asyncio
+import contextlib
+import hmac
+import logging
+import secrets
+from json import JSONDecodeError
+from typing import Awaitable, Callable, Tuple
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+from telegram import Bot, Update
+from telegram.ext import Application
+
+import metrics
+from config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class Server(uvicorn.Server):
+    """uvicorn.Server, который не пересылает процессу пойманный SIGINT/SIGTERM.
+
+    uvicorn после остановки повторно посылает сигнал со стандартным обработчиком,
+    и процесс завершается сразу - не дождавшись остановки бота и сохранения состояния.
+    """
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        with super().capture_signals():
+            yield
+            self._captured_signals.clear()
+
+
+def create_ingress_app(secret: str, dispatch: Callable[[dict], Awaitable[None]],
+                       status: Callable[[], Tuple[bool, dict]], path: str = WEBHOOK_PATH) -> Starlette:
+    """ASGI-приложение: прием обновлений от Telegram и проверки состояния.
+
+    POST path - проверяется секрет, обновление передается в dispatch, ответ возвращается сразу;
+    GET /healthz - процесс жив; GET /readyz - status() сообщает готовность и подробности;
+    GET /metrics - метрики процесса в формате Prometheus.
+    """
+
+    async def telegram_update(request: Request) -> Response:
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode(), secret.encode()):
+            return Response(status_code=403)
+
+        try:
+            data = await request.json()
+        except JSONDecodeError:
+            return Response(status_code=400)
+
+        await dispatch(data)
+        return Response()
+
+    async def healthz(request: Request) -> Response:
+        return PlainTextResponse('ok')
+
+    async def readyz(request: Request) -> Response:
+        ready, body = status()
+        return JSONResponse({'ready': ready, **body}, status_code=200 if ready else 503)
+
+    async def metrics_endpoint(request: Request) -> Response:
+        return PlainTextResponse(metrics.registry.render(), media_type='text/plain; version=0.0.4')
+
+    return Starlette(routes=[
+        Route(path, telegram_update, methods=['POST']),
+        Route('/healthz', healthz, methods=['GET']),
+        Route('/readyz', readyz, methods=['GET']),
+        Route('/metrics', metrics_endpoint, methods=['GET']),
+    ])
+
+
+def create_app(application: Application, secret: str, path: str = WEBHOOK_PATH) -> Starlette:
+    """Webhook одного процесса: обновления кладутся в очередь Application"""
+
+    async def dispatch(data: dict):
+        await application.update_queue.put(Update.de_json(data, application.bot))
+
+    def status():
+        body = {'update_queue': application.update_queue.qsize()}
+        # Глубина очередей UserOrderedUpdateProcessor
+        stats = getattr(application.update_processor, 'stats', None)
+        if stats is not None:
+            body['updates'] = stats()
+        return application.running, body
+
+    return create_ingress_app(secret, dispatch, status, path)
+
+
+async def register_webhook(bot: Bot, url: str, secret: str):
+    if not url:
+        raise RuntimeError('WEBHOOK_URL is not set')
+    await bot.set_webhook(
+        url=url.rstrip('/') + WEBHOOK_PATH,
+        secret_token=secret,
+        allowed_updates=Update.ALL_TYPES
+    )
+    logging.info(f"Webhook set to {url.rstrip('/')}{WEBHOOK_PATH}")
+
+
+async def serve(application: Application, url: str = WEBHOOK_URL, secret: str = WEBHOOK_SECRET,
+                host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT, set_webhook: bool = True):
+    """Запускает Application и HTTP-сервер до остановки сервера (SIGINT/SIGTERM)"""
+    # Telegram допускает в секрете только A-Z, a-z, 0-9, _ и -
+    secret = secret or secrets.token_urlsafe(32)
+    server = Server(uvicorn.Config(
+        create_app(application, secret), host=host, port=port,
+        log_level='warning', access_log=False
+    ))
+
+    # post_init/post_shutdown вызывает только run_polling, поэтому здесь - вручную.
+    # post_shutdown - после shutdown(): там сохраняется persistence, а база должна быть еще открыта
+    try:
+        async with application:
+            if application.post_init:
+                await application.post_init(application)
+
+            if set_webhook:
+                await register_webhook(application.bot, url, secret)
+
+            await application.start()
+            try:
+                await server.serve()
+            finally:
+                await application.stop()
+    finally:
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def run(application: Application):
+    asyncio.run(serve(application))